@@ -1,10 +1,11 @@
+import uuid
 from typing import Annotated
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth.models import AuthUser, AuthVerifyCode
-from app.auth.schemas import AuthUserSchema, AuthVerifyCodeSchema
+from app.auth.models import AuthUser
+from app.auth.schemas import AuthUserSchema
 from app.common.repositories import BaseRepository
 from app.database.pg_client import get_db
 
@@ -13,19 +14,19 @@ class AuthUserRepository(BaseRepository[AuthUser, AuthUserSchema]):
     model = AuthUser
     schema = AuthUserSchema
 
+    async def get_or_create(self, email: str) -> AuthUserSchema:
+        # один запрос вместо get_one + add; DO UPDATE нужен, чтобы RETURNING вернул и существующую строку
+        users = await self.upsert({"email": email}, conflict=["email"], update_fields=["email"])
+        return users[0]
+
+    async def set_active(self, user_id: uuid.UUID, is_active: bool) -> AuthUserSchema:
+        users = await self.update_where({"is_active": is_active}, id=user_id)
+        if not users:
+            raise ValueError(f"{self.model.__name__} not found with id: {user_id}")
+        return users[0]
+
 
 def get_user_repository(
         session: Annotated[AsyncSession, Depends(get_db)],
 ) -> AuthUserRepository:
     return AuthUserRepository(session)
-
-
-class AuthVerifyCodeRepository(BaseRepository[AuthVerifyCode, AuthVerifyCodeSchema]):
-    model = AuthVerifyCode
-    schema = AuthVerifyCodeSchema
-
-
-def get_verify_code_repository(
-        session: Annotated[AsyncSession, Depends(get_db)],
-) -> AuthVerifyCodeRepository:
-    return AuthVerifyCodeRepository(session)
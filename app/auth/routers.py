@@ -1,17 +1,11 @@
-import datetime
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.exc import SQLAlchemyError
 
-from app.auth.repositories import (
-    AuthUserRepository,
-    AuthVerifyCodeRepository,
-    get_user_repository,
-    get_verify_code_repository,
-)
-from app.auth.schemas import SendCodeSchema, VerifyCodeSchema
+from app.auth.schemas import AuthUserSchema, SendCodeSchema, VerifyCodeSchema
 from app.auth.services import AuthService, get_auth_service
+from app.auth.utils import generate_code, get_current_user
 
 router = APIRouter(prefix="/auth", tags=["Users"])
 
@@ -19,20 +13,21 @@ router = APIRouter(prefix="/auth", tags=["Users"])
 @router.post("/send-code", response_model=dict)
 async def send_code(
         data: SendCodeSchema,
-        user_repo: Annotated[AuthUserRepository, Depends(get_user_repository)],
-        verify_code_repo: Annotated[AuthVerifyCodeRepository, Depends(get_verify_code_repository)],
+        auth_service: Annotated[AuthService, Depends(get_auth_service)],
 ):
-    try:
-        user = await user_repo.get_one(email=data.email)
-    except ValueError:
-        user = await user_repo.add(**data.model_dump())
-    try:
-        code = await verify_code_repo.add(
-            user_id=user.id,
+    code = generate_code()
+    retry_after = await auth_service.code_store.issue(data.email, code)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Verify code was sent recently",
+            headers={"Retry-After": str(retry_after)},
         )
+    try:
+        await auth_service.user_repo.get_or_create(data.email)
     except SQLAlchemyError:
         raise HTTPException(status_code=500, detail="Internal Server Error")
-    return {"status": f"verify code sent on email {code.code}"}
+    return {"status": f"verify code sent on email {code}"}
 
 
 @router.post("/verify-code", response_model=dict)
@@ -40,18 +35,23 @@ async def verify_code(
         data: VerifyCodeSchema,
         auth_service: Annotated[AuthService, Depends(get_auth_service)],
 ):
+    # код погашается атомарно, поэтому в БД идём только за уже подтверждённым email
+    if not await auth_service.code_store.consume(data.email, data.code):
+        raise HTTPException(status_code=401, detail="Wrong code")
     try:
         user = await auth_service.user_repo.get_one(email=data.email)
     except ValueError:
         raise HTTPException(status_code=400, detail="Email not found")
-    try:
-        now = datetime.datetime.now(datetime.timezone.utc)
-        _ = await auth_service.code_repo.get_one(
-            user_id=user.id,
-            code=data.code,
-            expired_at__gt=now,
-        )
-        token = auth_service.create_access_token(user)
-    except ValueError:
-        raise HTTPException(status_code=401, detail="Wrong code")
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="User is inactive")
+    token = auth_service.create_access_token(user)
     return {"token": token}
+
+
+@router.post("/deactivate", response_model=AuthUserSchema)
+async def deactivate_user(
+        user: Annotated[AuthUserSchema, Depends(get_current_user)],
+        auth_service: Annotated[AuthService, Depends(get_auth_service)],
+):
+    # set_user_active сбрасывает кэши пользователя, и уже выданные токены перестают работать
+    return await auth_service.set_user_active(user.id, False)
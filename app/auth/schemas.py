@@ -1,7 +1,7 @@
 import datetime
 import uuid
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 
 from app.common.schemas import OrmModel
 
@@ -9,6 +9,12 @@ from app.common.schemas import OrmModel
 class EmailSchema(BaseModel):
     email: EmailStr
 
+    # email приводим к одному виду на входе: по нему ищутся и код в Redis, и пользователь в БД
+    @field_validator("email")
+    @classmethod
+    def normalize_email(cls, value: str) -> str:
+        return value.lower()
+
 
 class SendCodeSchema(EmailSchema):
     pass
@@ -23,9 +29,3 @@ class AuthUserSchema(OrmModel):
     email: EmailStr
     is_active: bool
     created_at: datetime.datetime
-
-
-class AuthVerifyCodeSchema(OrmModel):
-    user_id: uuid.UUID
-    code: str
-    expired_at: datetime.datetime
@@ -1,40 +1,60 @@
+import datetime
+import uuid
 from typing import Annotated
 
 from fastapi import Depends
 from jose import jwt
 
-from app.auth.repositories import (
-    AuthUserRepository,
-    AuthVerifyCodeRepository,
-    get_user_repository,
-    get_verify_code_repository,
-)
+from app.auth.repositories import AuthUserRepository, get_user_repository
 from app.auth.schemas import AuthUserSchema
+from app.auth.utils import invalidate_user
 from app.config.main import settings
+from app.database.redis_client import (
+    RedisUserCache,
+    RedisVerifyCodeStore,
+    get_user_cache,
+    get_verify_code_store,
+)
 
 
 class AuthService:
     def __init__(
             self,
             user_repo: AuthUserRepository,
-            code_repo: AuthVerifyCodeRepository,
+            code_store: RedisVerifyCodeStore,
+            user_cache: RedisUserCache,
     ):
         self.user_repo = user_repo
-        self.code_repo = code_repo
+        self.code_store = code_store
+        self.user_cache = user_cache
 
     @staticmethod
     def create_access_token(user: AuthUserSchema) -> str | None:
-        data = {"sub": user.id.__str__()}
+        now = datetime.datetime.now(datetime.timezone.utc)
+        data = {
+            "sub": user.id.__str__(),
+            "iat": now,
+            "exp": now + datetime.timedelta(minutes=settings.security.ACCESS_TOKEN_EXPIRE_MINUTES),
+        }
         to_encode = data.copy()
         encoded_jwt = jwt.encode(to_encode, settings.security.SECRET, algorithm=settings.security.ALGORITHM)
         return encoded_jwt
 
+    async def set_user_active(self, user_id: uuid.UUID, is_active: bool) -> AuthUserSchema:
+        user = await self.user_repo.set_active(user_id, is_active)
+        await self.user_repo.session.commit()
+        # после коммита: иначе параллельный запрос успеет закэшировать старое значение
+        await invalidate_user(user_id, self.user_cache)
+        return user
+
 
 def get_auth_service(
         user_repo: Annotated[AuthUserRepository, Depends(get_user_repository)],
-        code_repo: Annotated[AuthVerifyCodeRepository, Depends(get_verify_code_repository)],
+        code_store: Annotated[RedisVerifyCodeStore, Depends(get_verify_code_store)],
+        user_cache: Annotated[RedisUserCache, Depends(get_user_cache)],
 ) -> AuthService:
     return AuthService(
         user_repo=user_repo,
-        code_repo=code_repo,
+        code_store=code_store,
+        user_cache=user_cache,
     )
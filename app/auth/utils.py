@@ -1,23 +1,89 @@
-from fastapi import Depends, Security
+import hashlib
+import logging
+import secrets
+import string
+import time
+import uuid
+
+from fastapi import Depends, HTTPException, Security, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
+from redis.exceptions import RedisError
 
 from app.auth.repositories import AuthUserRepository, get_user_repository
 from app.auth.schemas import AuthUserSchema
+from app.common.cache import LRUCache
 from app.config.main import settings
+from app.database.redis_client import RedisUserCache, get_user_cache
+
+logger = logging.getLogger(__name__)
+
+# ключ — хэш токена, сам токен в памяти процесса не храним
+token_cache: LRUCache[dict] = LRUCache(settings.security.TOKEN_CACHE_SIZE, settings.security.TOKEN_CACHE_TTL)
+# короткий TTL ограничивает, сколько другой воркер может видеть пользователя после инвалидации
+user_cache: LRUCache[AuthUserSchema] = LRUCache(
+    settings.security.USER_LOCAL_CACHE_SIZE,
+    settings.security.USER_LOCAL_CACHE_TTL,
+)
+
+
+def generate_code(length: int = 6) -> str:
+    return "".join(secrets.choice(string.ascii_uppercase) for _ in range(length))
 
 
 def parse_token(token: str) -> dict | None:
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        payload = jwt.decode(token, settings.security.SECRET, algorithms=[settings.security.ALGORITHM])
+        payload = jwt.decode(
+            token,
+            settings.security.SECRET,
+            algorithms=[settings.security.ALGORITHM],
+            options={"require_exp": True},
+        )
         user_id: str = payload.get("sub")
         if user_id is None:
             return None
     except JWTError:
         return None
-    return {
+    token_data = {
         "sub": user_id,
     }
+    # запись не должна пережить сам токен
+    token_cache.set(key, token_data, ttl=payload["exp"] - time.time())
+    return token_data
+
+
+async def load_user(
+        user_id: uuid.UUID,
+        auth_db: AuthUserRepository,
+        redis_cache: RedisUserCache,
+) -> AuthUserSchema:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    try:
+        cached = await redis_cache.get(user_id)
+    except RedisError:
+        logger.exception("User cache is unavailable")
+        cached = None
+    if cached is not None:
+        user = AuthUserSchema.model_validate(cached)
+    else:
+        user = await auth_db.get_one(id=user_id)
+        try:
+            await redis_cache.set(user_id, user.model_dump(mode="json"))
+        except RedisError:
+            logger.exception("User cache is unavailable")
+    user_cache.set(user_id, user)
+    return user
+
+
+async def invalidate_user(user_id: uuid.UUID, redis_cache: RedisUserCache):
+    user_cache.pop(user_id)
+    await redis_cache.invalidate(user_id)
 
 
 security_scheme = HTTPBearer()
@@ -26,13 +92,19 @@ security_scheme = HTTPBearer()
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Security(security_scheme),
     auth_db: AuthUserRepository = Depends(get_user_repository),
-) -> AuthUserSchema | None:
+    redis_cache: RedisUserCache = Depends(get_user_cache),
+) -> AuthUserSchema:
     token = credentials.credentials
     token_data = parse_token(token)
-    if not token_data:
-        return None
-    user_id = token_data.get("sub")
+    user_id = token_data.get("sub") if token_data else None
     if not user_id:
-        return None
-    user = await auth_db.get_one(id=user_id)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    try:
+        user = await load_user(uuid.UUID(user_id), auth_db, redis_cache)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    # отключённый пользователь перестаёт проходить сразу после invalidate_user на этом воркере
+    # и не позже USER_LOCAL_CACHE_TTL на остальных
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is inactive")
     return user
@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional
+
+from app.config.main import settings
+from app.utils.openai import count_message_tokens
+
+OPENAI_MESSAGE_FIELDS = ("role", "content")
+# ключ приватного варианта картинки: перед отправкой его заменяет подписанная ссылка
+VARIANT_KEY_FIELD = "variant_key"
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+def to_openai_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    match item.get("type"):
+        case "file":
+            # файл модели не передаём: она видит только имя, а нужные фрагменты приходят отдельным сообщением
+            return {"type": "text", "text": f"[Attached file: {(item.get('meta') or {}).get('filename', 'file')}]"}
+        case "image_url" if (item.get("meta") or {}).get(VARIANT_KEY_FIELD):
+            return {
+                "type": "image_url",
+                "image_url": {key: value for key, value in item["image_url"].items() if key in ("url", "detail")},
+                VARIANT_KEY_FIELD: item["meta"][VARIANT_KEY_FIELD],
+            }
+    return item
+
+
+def to_openai_content(content: Any) -> Any:
+    if not isinstance(content, list):
+        return content
+    return [to_openai_item(item) for item in content]
+
+
+def to_openai_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    openai_message = {field: message[field] for field in OPENAI_MESSAGE_FIELDS if field in message}
+    if "content" in openai_message:
+        openai_message["content"] = to_openai_content(openai_message["content"])
+    return openai_message
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    tokens = message.get("tokens")
+    return tokens if tokens is not None else count_message_tokens(message)
+
+
+def context_budget(model: str) -> int:
+    context_tokens = settings.chat.MODEL_CONTEXT_TOKENS.get(model, settings.chat.DEFAULT_CONTEXT_TOKENS)
+    return max(0, context_tokens - settings.chat.COMPLETION_RESERVE_TOKENS)
+
+
+def pack_history(history: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    packed = []
+    used = 0
+    # идём от свежих сообщений к старым и останавливаемся на первом, которое не влезает,
+    # чтобы в контексте не было дыр
+    for message in reversed(history):
+        tokens = message_tokens(message)
+        if used + tokens > budget:
+            break
+        packed.append(to_openai_message(message))
+        used += tokens
+    packed.reverse()
+    return packed
+
+
+def build_context(
+        history: List[Dict[str, Any]],
+        message_count: Optional[int],
+        summary: Optional[Dict[str, Any]],
+        budget: int,
+) -> List[Dict[str, Any]]:
+    if not summary or message_count is None:
+        return pack_history(history, budget)
+    # в контекст идут только сообщения после якоря, всё что раньше — уже в саммари
+    tail = max(0, message_count - summary["anchor_index"])
+    history = history[len(history) - tail:] if tail < len(history) else history
+    summary_message = {
+        "role": "system",
+        "content": SUMMARY_HEADER + summary["summary"],
+        "tokens": summary["tokens"],
+    }
+    return [to_openai_message(summary_message)] + pack_history(history, budget - message_tokens(summary_message))
+
+
+def insert_recalled(
+        messages: List[Dict[str, Any]],
+        recalled: Optional[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    if not recalled:
+        return messages
+    position = next((i for i, message in enumerate(messages) if message["role"] != "system"), len(messages))
+    return messages[:position] + [to_openai_message(recalled)] + messages[position:]
+
+
+def tail_size(messages: List[Dict[str, Any]]) -> int:
+    return sum(1 for message in messages if message["role"] != "system")
+
+
+def strip_variant_keys(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # без оптимизатора подписать варианты нечем: модель получает исходные ссылки
+    return [
+        {**message, "content": [
+            {key: value for key, value in item.items() if key != VARIANT_KEY_FIELD} for item in message["content"]
+        ]} if isinstance(message.get("content"), list) else message
+        for message in messages
+    ]
@@ -1,8 +1,9 @@
+import datetime
 import enum
 import uuid
 from typing import Optional
 
-from sqlalchemy import JSON, UUID, Boolean, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, TIMESTAMP, UUID, Boolean, Enum, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import (
     Mapped,
     mapped_column,
@@ -28,6 +29,9 @@ class ContentTypeEnum(str, enum.Enum):
 
 class ChatSession(Base, BaseModelMixin, CreatedAtMixin, UpdatedAtMixin):
     __tablename__ = "chat_session"
+    __table_args__ = (
+        Index("ix_chat_session_user_id_updated_at_id", "user_id", "updated_at", "id"),
+    )
 
     user_id: Mapped[Optional[uuid.UUID]] = mapped_column(
         UUID(as_uuid=True),
@@ -36,6 +40,12 @@ class ChatSession(Base, BaseModelMixin, CreatedAtMixin, UpdatedAtMixin):
     )
     title: Mapped[str | None] = mapped_column(String(255))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    message_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    last_message_at: Mapped[Optional[datetime.datetime]] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=True,
+    )
+    last_message_preview: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
 
     messages: Mapped[list["ChatMessage"]] = relationship(
         back_populates="chat",
@@ -50,10 +60,14 @@ class ChatSession(Base, BaseModelMixin, CreatedAtMixin, UpdatedAtMixin):
 
 class ChatMessage(Base, BaseModelMixin, CreatedAtMixin):
     __tablename__ = "chat_message"
+    __table_args__ = (
+        Index("ix_chat_message_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
 
     chat_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("chat_session.id", ondelete="CASCADE"), nullable=False)
     role: Mapped[RoleEnum] = mapped_column(Enum(RoleEnum), nullable=False)
     content: Mapped[dict] = mapped_column(JSON, nullable=False)
+    token_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     chat: Mapped["ChatSession"] = relationship(back_populates="messages")
 
@@ -0,0 +1,180 @@
+import asyncio
+import dataclasses
+import datetime
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.chat.models import RoleEnum
+from app.chat.repositories import ChatMessageRepository, ChatSessionRepository
+from app.chat.utils import message_preview
+from app.config.main import settings
+from app.database.pg_client import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class WriteBehindMetrics:
+    enqueued: int = 0
+    persisted: int = 0
+    failed: int = 0
+    batches: int = 0
+    retries: int = 0
+    pending: int = 0
+    last_batch_size: int = 0
+    last_flush_seconds: float = 0.0
+    last_flush_at: Optional[datetime.datetime] = None
+
+
+class MessageWriteBehind:
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            max_queue_size: int = 10000,
+            batch_size: int = 500,
+            flush_interval: float = 0.1,
+            max_retries: int = 3,
+    ):
+        self._session_maker = session_maker
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._metrics = WriteBehindMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def metrics(self) -> WriteBehindMetrics:
+        self._metrics.pending = self._queue.qsize() if self._queue else 0
+        return self._metrics
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        # sentinel: воркер дописывает всё, что уже в очереди, и завершается
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("Message write-behind stopped: %s", self.metrics)
+
+    async def enqueue(
+            self,
+            chat_id: uuid.UUID,
+            role: RoleEnum,
+            content: Any,
+            token_count: Optional[int] = None,
+    ) -> uuid.UUID:
+        if not self.is_running:
+            raise RuntimeError("Message write-behind is not running")
+        message_id = uuid.uuid4()
+        # created_at фиксируем при постановке в очередь: строки одного батча
+        # вставляются в одной транзакции и получили бы одинаковый now()
+        await self._queue.put({
+            "id": message_id,
+            "chat_id": chat_id,
+            "role": role,
+            "content": content,
+            "token_count": token_count,
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+        })
+        self._metrics.enqueued += 1
+        return message_id
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        persisted = await self._write_rows(batch)
+        self._metrics.persisted += persisted
+        self._metrics.batches += 1
+        self._metrics.last_batch_size = len(batch)
+        self._metrics.last_flush_seconds = time.perf_counter() - started
+        self._metrics.last_flush_at = datetime.datetime.now(datetime.timezone.utc)
+
+    async def _write_rows(self, rows: List[Dict[str, Any]]) -> int:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._session_maker() as session:
+                    await ChatMessageRepository(session).add_many(rows, returning=False)
+                    await ChatSessionRepository(session).register_messages(self._chat_stats(rows))
+                    await session.commit()
+                return len(rows)
+            except (IntegrityError, DataError):
+                if len(rows) == 1:
+                    self._metrics.failed += 1
+                    logger.exception("Dropped chat message %s for chat %s", rows[0]["id"], rows[0]["chat_id"])
+                    return 0
+                break
+            except (SQLAlchemyError, OSError):
+                if attempt == self.max_retries:
+                    self._metrics.failed += len(rows)
+                    logger.exception("Failed to persist %d chat messages", len(rows))
+                    return 0
+                self._metrics.retries += 1
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        # битая строка откатывает всю транзакцию: делим пачку пополам, пока не найдём её,
+        # чтобы не терять сообщения других пользователей
+        middle = len(rows) // 2
+        return await self._write_rows(rows[:middle]) + await self._write_rows(rows[middle:])
+
+    @staticmethod
+    def _chat_stats(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        stats: Dict[uuid.UUID, Dict[str, Any]] = {}
+        for row in batch:
+            item = stats.setdefault(row["chat_id"], {"chat_id": row["chat_id"], "count": 0})
+            item["count"] += 1
+            item["last_message_at"] = row["created_at"]
+            item["preview"] = message_preview(row["content"])
+        return list(stats.values())
+
+
+message_writer = MessageWriteBehind(
+    async_session_maker,
+    max_queue_size=settings.chat.WRITE_BEHIND_QUEUE_SIZE,
+    batch_size=settings.chat.WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.chat.WRITE_BEHIND_FLUSH_INTERVAL_MS / 1000,
+    max_retries=settings.chat.WRITE_BEHIND_MAX_RETRIES,
+)
+
+
+def get_message_writer() -> MessageWriteBehind | None:
+    if not settings.chat.WRITE_BEHIND_ENABLED:
+        return None
+    return message_writer
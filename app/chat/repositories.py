@@ -1,10 +1,13 @@
-from typing import Annotated
+import datetime
+import uuid
+from typing import Annotated, Any, Dict, List, Optional
 
 from fastapi import Depends
+from sqlalchemy import bindparam, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.chat.models import ChatMessage, ChatSession
-from app.chat.schemas import ChatMessageSchema, ChatSessionSchema
+from app.chat.models import ChatMessage, ChatSession, ChatSummary
+from app.chat.schemas import ChatMessageSchema, ChatSessionSchema, ChatSummarySchema
 from app.common.repositories import BaseRepository
 from app.database.pg_client import get_db
 
@@ -13,6 +16,43 @@ class ChatSessionRepository(BaseRepository[ChatSession, ChatSessionSchema]):
     model = ChatSession
     schema = ChatSessionSchema
 
+    async def register_messages(self, stats: List[Dict[str, Any]]):
+        if not stats:
+            return
+        table = ChatSession.__table__
+        query = (
+            update(table)
+            .where(table.c.id == bindparam("b_chat_id"))
+            .values(
+                message_count=table.c.message_count + bindparam("b_count"),
+                last_message_at=bindparam("b_last_message_at"),
+                last_message_preview=func.coalesce(bindparam("b_preview"), table.c.last_message_preview),
+                updated_at=func.now(),
+            )
+        )
+        await self.session.execute(query, [
+            {
+                "b_chat_id": item["chat_id"],
+                "b_count": item["count"],
+                "b_last_message_at": item["last_message_at"],
+                "b_preview": item["preview"],
+            }
+            for item in stats
+        ])
+
+    async def register_message(
+            self,
+            chat_id: uuid.UUID,
+            preview: Optional[str],
+            created_at: Optional[datetime.datetime] = None,
+    ):
+        await self.register_messages([{
+            "chat_id": chat_id,
+            "count": 1,
+            "last_message_at": created_at or datetime.datetime.now(datetime.timezone.utc),
+            "preview": preview,
+        }])
+
 
 def get_chat_repository(
         session: Annotated[AsyncSession, Depends(get_db)],
@@ -29,3 +69,22 @@ def get_message_repository(
         session: Annotated[AsyncSession, Depends(get_db)],
 ) -> ChatMessageRepository:
     return ChatMessageRepository(session)
+
+
+class ChatSummaryRepository(BaseRepository[ChatSummary, ChatSummarySchema]):
+    model = ChatSummary
+    schema = ChatSummarySchema
+
+    async def get_latest(self, chat_id: uuid.UUID) -> Optional[ChatSummarySchema]:
+        summaries = await self.get_list(
+            limit=1,
+            order_by="anchor_index desc",
+            chat_id=chat_id,
+        )
+        return summaries[0] if summaries else None
+
+
+def get_summary_repository(
+        session: Annotated[AsyncSession, Depends(get_db)],
+) -> ChatSummaryRepository:
+    return ChatSummaryRepository(session)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.chat.models import RoleEnum
+from app.chat.utils import message_text
+from app.config.main import settings
+from app.database.vector_store import VectorFilter, VectorPoint, VectorStore, get_vector_store
+from app.managers.embeddings import EmbeddingClient, get_embedding_client
+from app.utils.openai import MESSAGE_OVERHEAD_TOKENS, count_text_tokens
+
+logger = logging.getLogger(__name__)
+
+RECALL_HEADER = "Relevant messages from earlier in this conversation:\n"
+
+
+class MessageRetriever:
+    def __init__(
+            self,
+            store: VectorStore,
+            embedder: EmbeddingClient,
+            collection: str,
+            dimensions: int,
+            top_k: int = 4,
+            min_score: Optional[float] = None,
+            max_tokens: int = 1024,
+            queue_size: int = 10000,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.collection = collection
+        self.dimensions = dimensions
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_tokens = max_tokens
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dropped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.is_running:
+            return
+        await self.store.ensure_collection(self.collection, self.dimensions, indexed_fields=["chat_id"])
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if not self.is_running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def index(
+            self,
+            chat_id: uuid.UUID,
+            message_id: uuid.UUID,
+            role: RoleEnum,
+            index: int,
+            content: Any,
+            vector: Optional[List[float]] = None,
+    ):
+        if not self.is_running:
+            return
+        text = message_text(content)
+        if not text:
+            return
+        point = {
+            "id": message_id,
+            "vector": vector,
+            "payload": {
+                "chat_id": str(chat_id),
+                "role": role.value,
+                "index": index,
+                "text": text,
+            },
+        }
+        try:
+            self._queue.put_nowait(point)
+        except asyncio.QueueFull:
+            # индексация best-effort: не тормозим чат, если эмбеддинги не успевают
+            self._dropped += 1
+            logger.warning("Message index queue is full, dropped %d messages so far", self._dropped)
+
+    async def recall(
+            self,
+            chat_id: uuid.UUID,
+            content: Any,
+            before_index: int,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        text = message_text(content)
+        if not text or before_index <= 0 or not self.is_running:
+            return None, None
+        try:
+            vector = await self.embedder.embed_one(text)
+            hits = await self.store.search(
+                self.collection,
+                vector,
+                limit=self.top_k,
+                filters=VectorFilter(match={"chat_id": str(chat_id)}, lt={"index": before_index}),
+                min_score=self.min_score,
+            )
+        except Exception:
+            # поиск по истории — необязательная добавка, генерация идёт и без него
+            logger.exception("Failed to recall messages for chat %s", chat_id)
+            return None, None
+        lines = []
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_text_tokens(RECALL_HEADER)
+        for hit in sorted(hits, key=lambda item: item.payload["index"]):
+            line = f"{hit.payload['role']}: {hit.payload['text']}"
+            line_tokens = count_text_tokens(line)
+            if tokens + line_tokens > self.max_tokens:
+                continue
+            lines.append(line)
+            tokens += line_tokens
+        if not lines:
+            return None, vector
+        message = {
+            "role": "system",
+            "content": RECALL_HEADER + "\n".join(lines),
+            "tokens": tokens,
+        }
+        return message, vector
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            point = await self._queue.get()
+            if point is None:
+                break
+            batch = [point]
+            while not self._queue.empty() and len(batch) < self.embedder.batch_size:
+                point = self._queue.get_nowait()
+                if point is None:
+                    stopping = True
+                    break
+                batch.append(point)
+            await self._index_batch(batch)
+
+    async def _index_batch(self, batch: List[Dict[str, Any]]):
+        missing = [point for point in batch if point["vector"] is None]
+        try:
+            if missing:
+                vectors = await self.embedder.embed([point["payload"]["text"] for point in missing])
+                for point, vector in zip(missing, vectors):
+                    point["vector"] = vector
+            await self.store.upsert(self.collection, [VectorPoint.model_validate(point) for point in batch])
+        except Exception:
+            # одна битая пачка не должна останавливать воркер: без него индексация встанет до рестарта
+            logger.exception("Failed to index %d chat messages", len(batch))
+
+
+message_retriever = MessageRetriever(
+    get_vector_store(),
+    get_embedding_client(),
+    collection=settings.chat.RETRIEVAL_COLLECTION,
+    dimensions=settings.chat.EMBEDDING_DIMENSIONS,
+    top_k=settings.chat.RETRIEVAL_TOP_K,
+    min_score=settings.chat.RETRIEVAL_MIN_SCORE,
+    max_tokens=settings.chat.RETRIEVAL_MAX_TOKENS,
+    queue_size=settings.chat.RETRIEVAL_QUEUE_SIZE,
+)
+
+
+def get_message_retriever() -> MessageRetriever | None:
+    if not settings.chat.RETRIEVAL_ENABLED:
+        return None
+    return message_retriever
@@ -1,14 +1,22 @@
 import uuid
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends, Query, status
-from fastapi.websockets import WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.websockets import WebSocket
 from fastapi_pagination import Page, Params
 
 from app.auth.schemas import AuthUserSchema
 from app.auth.utils import get_current_user, parse_token
-from app.chat.schemas import ChatMessageSchema, ChatSessionSchema, ChatSessionSchemaWithMessages
+from app.chat.schemas import (
+    ChatMessageSchema,
+    ChatSessionSchema,
+    ChatSessionSchemaWithMessages,
+    ChatSessionSummarySchema,
+    StreamParamsSchema,
+)
 from app.chat.services import ChatService, get_chat_service
+from app.chat.sessions import ChatSocketSession
+from app.common.schemas import CursorPage
 from app.managers.connections import ConnectionManager, get_ws_manager
 
 router = APIRouter(prefix="/chat", tags=["Chats"])
@@ -27,6 +35,26 @@ async def get_user_chats(
     return chats
 
 
+@router.get("/summaries", response_model=CursorPage[ChatSessionSummarySchema])
+async def get_user_chat_summaries(
+        user: Annotated[AuthUserSchema, Depends(get_current_user)],
+        chat_serv: Annotated[ChatService, Depends(get_chat_service)],
+        cursor: Optional[str] = Query(None),
+        size: int = Query(50, ge=1, le=100),
+):
+    try:
+        chats, next_cursor = await chat_serv.chat_repo.get_cursor_page(
+            limit=size,
+            cursor=cursor,
+            cursor_field="updated_at",
+            schema_cls=ChatSessionSummarySchema,
+            user_id=user.id,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return CursorPage(items=chats, next_cursor=next_cursor)
+
+
 @router.post("/", response_model=ChatSessionSchema)
 async def create_user_chat(
         user: Annotated[AuthUserSchema, Depends(get_current_user)],
@@ -62,37 +90,43 @@ async def get_chat_messages(
     )
 
 
+@router.get("/{chat_id}/messages/cursor", response_model=CursorPage[ChatMessageSchema])
+async def get_chat_messages_by_cursor(
+        chat_id: uuid.UUID,
+        user: Annotated[AuthUserSchema, Depends(get_current_user)],
+        chat_serv: Annotated[ChatService, Depends(get_chat_service)],
+        cursor: Optional[str] = Query(None),
+        size: int = Query(50, ge=1, le=100),
+):
+    if not await chat_serv.has_chat_access(chat_id, user.id):
+        raise HTTPException(status_code=404, detail="Chat not found")
+    try:
+        messages, next_cursor = await chat_serv.message_repo.get_cursor_page(
+            limit=size,
+            cursor=cursor,
+            chat_id=chat_id,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return CursorPage(items=messages, next_cursor=next_cursor)
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(
         websocket: WebSocket,
-        chat_serv: Annotated[ChatService, Depends(get_chat_service)],
         ws_manager: Annotated[ConnectionManager, Depends(get_ws_manager)],
+        stream_params: Annotated[StreamParamsSchema, Depends()],
         token: str = Query(...)
 ):
     try:
         user_data = parse_token(token)
         user_id = uuid.UUID(user_data["sub"])
-    except ValueError:
+    except (TypeError, ValueError):
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    await ws_manager.connect(user_id, websocket)
+    connection = await ws_manager.connect(user_id, websocket)
     try:
-        while True:
-            data = await websocket.receive_json()
-            if not (message := data["message"]) or data["type"] != "message":
-                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-                raise
-
-            model = data.get("model")
-            chat_id = uuid.UUID(message.get("chat_id"))
-            user_content = message.get("content")
-            await chat_serv.process_user_message(
-                model=model,
-                chat_id=chat_id,
-                user_content=user_content,
-                websocket=websocket,
-            )
-
-    except (WebSocketDisconnect, RuntimeError):
+        await ChatSocketSession(websocket, connection, stream_params, ws_manager=ws_manager).run()
+    finally:
         await ws_manager.disconnect(user_id, websocket)
@@ -6,10 +6,12 @@ from pydantic import BaseModel, Field
 
 from app.chat.models import ContentTypeEnum, RoleEnum
 from app.common.schemas import OrmModel
+from app.config.main import settings
 
 
 class ImageUrlSchema(BaseModel):
     url: str
+    detail: Optional[str] = None
 
 
 class ContentItemSchema(BaseModel):
@@ -24,6 +26,14 @@ class ChatMessageSchema(OrmModel):
     chat_id: uuid.UUID
     role: RoleEnum
     content: Union[ContentItemSchema, List[ContentItemSchema]]
+    token_count: Optional[int] = None
+    created_at: datetime.datetime
+
+
+class ChatSummarySchema(OrmModel):
+    chat_id: uuid.UUID
+    summary: str
+    anchor_index: Optional[int]
     created_at: datetime.datetime
 
 
@@ -35,5 +45,17 @@ class ChatSessionSchema(OrmModel):
     updated_at: datetime.datetime
 
 
+class ChatSessionSummarySchema(ChatSessionSchema):
+    message_count: int
+    last_message_at: Optional[datetime.datetime]
+    last_message_preview: Optional[str]
+
+
 class ChatSessionSchemaWithMessages(ChatSessionSchema):
     messages: List[ChatMessageSchema] = Field(default_factory=list)
+
+
+class StreamParamsSchema(BaseModel):
+    flush_interval_ms: int = Field(default=settings.chat.STREAM_FLUSH_INTERVAL_MS, ge=0)
+    flush_bytes: int = Field(default=settings.chat.STREAM_FLUSH_BYTES, ge=1)
+    flush_on_sentence: bool = settings.chat.STREAM_FLUSH_ON_SENTENCE
@@ -1,22 +1,47 @@
 import asyncio
-import json
+import datetime
 import uuid
+from contextlib import aclosing, asynccontextmanager
 from enum import Enum
-from typing import Annotated, Any, AsyncGenerator, Dict, List
+from functools import partial
+from typing import Annotated, Any, AsyncGenerator, Dict, List, Optional, Tuple
 
 import httpx
 from fastapi import Depends
-from fastapi.websockets import WebSocket, WebSocketDisconnect
 
+from app.chat.context import (
+    build_context,
+    context_budget,
+    insert_recalled,
+    strip_variant_keys,
+    tail_size,
+    to_openai_message,
+)
 from app.chat.models import RoleEnum
+from app.chat.persistence import MessageWriteBehind, get_message_writer
 from app.chat.repositories import (
     ChatMessageRepository,
     ChatSessionRepository,
+    ChatSummaryRepository,
     get_chat_repository,
     get_message_repository,
+    get_summary_repository,
 )
-from app.database.redis_client import RedisChatCache, get_redis_cache
-from app.managers.client import get_http_client
+from app.chat.retrieval import MessageRetriever, get_message_retriever
+from app.chat.schemas import ChatSessionSummarySchema, StreamParamsSchema
+from app.chat.summarizer import ChatSummarizer, get_chat_summarizer
+from app.chat.utils import attached_file_ids, message_preview
+from app.config.main import settings
+from app.database.pg_client import async_session_maker
+from app.database.redis_client import CompletionCache, RedisChatCache, get_completion_cache, get_redis_cache
+from app.file.images import ImageOptimizer, get_image_optimizer
+from app.file.ingestion import DocumentIngestor, get_document_ingestor
+from app.file.repositories import FileRepository, get_file_repository
+from app.managers.client import get_llm_transport
+from app.managers.streams import CoalescingStreamWriter, SendFunc
+from app.managers.transport import CircuitOpenError, LLMTransport
+from app.utils.openai import count_message_tokens, count_text_tokens
+from app.utils.sse import ChatCompletionStreamParser
 
 
 class ChatService:
@@ -25,70 +50,139 @@ class ChatService:
             chat_repo: ChatSessionRepository,
             message_repo: ChatMessageRepository,
             cache_repo: RedisChatCache,
-            client: httpx.AsyncClient,
+            client: LLMTransport,
+            summary_repo: ChatSummaryRepository,
+            message_writer: MessageWriteBehind | None = None,
+            summarizer: ChatSummarizer | None = None,
+            retriever: MessageRetriever | None = None,
+            completion_cache: CompletionCache | None = None,
+            ingestor: DocumentIngestor | None = None,
+            image_optimizer: ImageOptimizer | None = None,
+            file_repo: FileRepository | None = None,
     ):
         self.chat_repo = chat_repo
         self.message_repo = message_repo
         self.cache_repo = cache_repo
         self.client = client
+        self.summary_repo = summary_repo
+        self.message_writer = message_writer
+        self.summarizer = summarizer
+        self.retriever = retriever
+        self.completion_cache = completion_cache
+        self.ingestor = ingestor
+        self.image_optimizer = image_optimizer
+        self.file_repo = file_repo
+
+    async def has_chat_access(self, chat_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+        return await self.chat_repo.get_total_count(id=chat_id, user_id=user_id) > 0
 
     async def process_user_message(
             self,
             model: str,
             chat_id: uuid.UUID,
+            user_id: uuid.UUID,
             user_content: List[Dict[str, Any]],
-            websocket: WebSocket,
+            send: SendFunc,
+            stream_params: StreamParamsSchema | None = None,
+            use_cache: bool = False,
     ):
-        last_messages = await self._get_last_messages_from_cache(chat_id)
-        await self.message_repo.add(
-            chat_id=chat_id,
-            role=RoleEnum.user,
-            content=user_content,
-        )
+        if self.image_optimizer is not None:
+            # вариант считается один раз и сохраняется в meta, следующие ходы шлют его без обработки
+            user_content = await self.image_optimizer.prepare(user_content, partial(self._can_read, user_id=user_id))
         user_message = {
             "role": "user",
             "content": user_content,
         }
-        await self.cache_repo.append_message(chat_id, user_message)
-        assistant_content = await self._handle_model_response(
-            model,
-            last_messages,
-            user_message,
-            websocket,
-        )
-        await self.message_repo.add(
-            chat_id=chat_id,
-            role=RoleEnum.assistant,
-            content=assistant_content,
+        user_message["tokens"] = count_message_tokens(user_message)
+        history, message_count, summary = await self._get_context_from_cache(chat_id)
+        budget = context_budget(model) - user_message["tokens"]
+        if self.retriever is not None:
+            budget -= self.retriever.max_tokens
+        # до gather: сессия БД одна, и параллельно с сохранением сообщения её трогать нельзя
+        held_files = await self._held_files(attached_file_ids(user_content), user_id)
+        if held_files:
+            budget -= self.ingestor.max_tokens
+        last_messages = build_context(history, message_count, summary, budget)
+        user_message_id, (recalled, user_vector), excerpts = await asyncio.gather(
+            self._save_message(chat_id, RoleEnum.user, user_content, user_message["tokens"]),
+            self._recall(chat_id, user_content, before_index=message_count - tail_size(last_messages)),
+            self._retrieve_file_chunks(held_files, user_content),
         )
+        last_messages = insert_recalled(last_messages, recalled)
+        if excerpts:
+            # фрагменты файлов относятся к текущему вопросу, поэтому ставим их прямо перед ним
+            last_messages.append(to_openai_message(excerpts))
+        self._index_message(chat_id, user_message_id, RoleEnum.user, message_count, user_content, user_vector)
+        # коммит до стрима отдаёт соединение в пул: иначе оно простаивает в транзакции всю генерацию,
+        # а ответ модели сохраняется уже в новой транзакции
         await self.message_repo.session.commit()
+        try:
+            assistant_content = await self._handle_model_response(
+                model,
+                last_messages,
+                to_openai_message(user_message),
+                send,
+                stream_params or StreamParamsSchema(),
+                use_cache,
+            )
+        except BaseException:
+            # сообщение пользователя уже закоммичено или принято write-behind: кэш держим в ногу с БД
+            await self.cache_repo.append_message(chat_id, user_message)
+            raise
         assistant_message = {
             "role": "assistant",
             "content": assistant_content,
         }
-        await self.cache_repo.append_message(chat_id, assistant_message)
-        try:
-            await websocket.send_json({"type": "end"})
-        except (WebSocketDisconnect, RuntimeError) as e:
-            if isinstance(e, RuntimeError) and 'close message' not in str(e):
-                raise
+        assistant_message["tokens"] = count_message_tokens(assistant_message)
+        assistant_message_id = await self._save_message(
+            chat_id,
+            RoleEnum.assistant,
+            assistant_content,
+            assistant_message["tokens"],
+        )
+        await self.message_repo.session.commit()
+        # счётчик в Redis двигаем только после коммита, иначе откат оставит его впереди БД
+        total_count = await self.cache_repo.append_messages(chat_id, [user_message, assistant_message])
+        self._index_message(chat_id, assistant_message_id, RoleEnum.assistant, message_count + 1, assistant_content)
+        if self.summarizer is not None:
+            self.summarizer.maybe_schedule(chat_id, total_count, summary)
+        await send({"type": "end"})
 
     async def _handle_model_response(
             self,
             model: str,
             last_messages: List[Dict[str, Any]],
             user_message: Dict[str, Any],
-            websocket: WebSocket,
+            send: SendFunc,
+            stream_params: StreamParamsSchema,
+            use_cache: bool = False,
     ) -> List[Dict[str, Any]]:
         match model:
             case "gpt-4":
-                full_answer = ""
                 openai_messages = last_messages + [user_message]
+                writer = CoalescingStreamWriter(
+                    send=send,
+                    flush_interval=stream_params.flush_interval_ms / 1000,
+                    flush_bytes=stream_params.flush_bytes,
+                    flush_on_sentence=stream_params.flush_on_sentence,
+                )
+                cache_key = None
+                if use_cache and self.completion_cache is not None:
+                    cache_key = self.completion_cache.make_key(model, openai_messages)
+                    if (cached := await self.completion_cache.get(cache_key)) is not None:
+                        async with writer:
+                            for start in range(0, len(cached), stream_params.flush_bytes):
+                                await writer.write(cached[start:start + stream_params.flush_bytes])
+                        return [{"type": "text", "text": cached}]
+                # подписываем после ключа кэша: ссылки каждый раз новые и не должны влиять на попадание
+                openai_messages = await self._sign_images(openai_messages)
                 try:
-                    async for token in self._stream_chat_completion(model, openai_messages):
-                        full_answer += token
-                        await self._safe_send(websocket, {"type": "token", "content": token})
-                    return [{"type": "text", "text": full_answer}]
+                    async with writer:
+                        async for token in self._stream_chat_completion(model, openai_messages):
+                            await writer.write(token)
+                    if cache_key is not None:
+                        await self.completion_cache.set(cache_key, writer.text)
+                    return [{"type": "text", "text": writer.text}]
                 except Exception:
                     # логирование ошибки
                     raise
@@ -106,51 +200,124 @@ class ChatService:
             "messages": messages,
         }
         try:
-            async with self.client.stream("POST", "chat/completions", json=payload) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[len("data: "):].strip()
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            delta = chunk["choices"][0]["delta"]
-                            if "content" in delta:
-                                yield delta["content"]
-                        except (json.JSONDecodeError, KeyError):
-                            # log
-                            continue
-        except (httpx.RequestError, httpx.HTTPStatusError, asyncio.TimeoutError) as e:
+            parser = ChatCompletionStreamParser()
+            async with aclosing(self.client.stream("POST", "chat/completions", json=payload)) as chunks:
+                async for chunk in chunks:
+                    for delta in parser.feed(chunk):
+                        yield delta
+                    if parser.done:
+                        break
+        except (httpx.RequestError, httpx.HTTPStatusError, asyncio.TimeoutError, CircuitOpenError) as e:
             # log
             raise RuntimeError(f"OpenAI API error: {e}") from e
 
-    async def _get_last_messages_from_cache(
+    async def _save_message(
             self,
             chat_id: uuid.UUID,
-    ) -> List[Dict[str, Any]]:
-        messages_context = await self.cache_repo.get_last_messages(chat_id, limit=15)
-        if not messages_context:
+            role: RoleEnum,
+            content: List[Dict[str, Any]],
+            token_count: int,
+    ) -> uuid.UUID:
+        if self._writes_behind:
+            return await self.message_writer.enqueue(
+                chat_id=chat_id,
+                role=role,
+                content=content,
+                token_count=token_count,
+            )
+        message = await self.message_repo.add(
+            chat_id=chat_id,
+            role=role,
+            content=content,
+            token_count=token_count,
+            # как и в write-behind: server_default now() — время начала транзакции,
+            # и сообщения одного хода получили бы равный created_at
+            created_at=datetime.datetime.now(datetime.timezone.utc),
+        )
+        await self.chat_repo.register_message(chat_id, message_preview(content), message.created_at)
+        return message.id
+
+    @property
+    def _writes_behind(self) -> bool:
+        return self.message_writer is not None and self.message_writer.is_running
+
+    async def _recall(
+            self,
+            chat_id: uuid.UUID,
+            content: List[Dict[str, Any]],
+            before_index: int,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        if self.retriever is None:
+            return None, None
+        return await self.retriever.recall(chat_id, content, before_index)
+
+    async def _can_read(self, url: str, user_id: uuid.UUID) -> bool:
+        return self.file_repo is not None and await self.file_repo.holds_url(url, user_id)
+
+    async def _sign_images(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.image_optimizer is None:
+            return strip_variant_keys(messages)
+        return await self.image_optimizer.sign(messages)
+
+    async def _held_files(self, file_ids: List[uuid.UUID], user_id: uuid.UUID) -> Dict[uuid.UUID, str]:
+        if self.ingestor is None or self.file_repo is None or not file_ids:
+            return {}
+        # file_id приходит из meta от клиента: ищем только в файлах, на которые у него есть ссылка
+        return await self.file_repo.held_filenames(file_ids, user_id)
+
+    async def _retrieve_file_chunks(
+            self,
+            filenames: Dict[uuid.UUID, str],
+            content: List[Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        if self.ingestor is None or not filenames:
+            return None
+        return await self.ingestor.retrieve(filenames, content)
+
+    def _index_message(
+            self,
+            chat_id: uuid.UUID,
+            message_id: uuid.UUID,
+            role: RoleEnum,
+            index: int,
+            content: List[Dict[str, Any]],
+            vector: Optional[List[float]] = None,
+    ):
+        if self.retriever is not None:
+            self.retriever.index(chat_id, message_id, role, index, content, vector)
+
+    async def _get_context_from_cache(
+            self,
+            chat_id: uuid.UUID,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int], Optional[Dict[str, Any]]]:
+        limit = settings.chat.HISTORY_CONTEXT_MESSAGES
+        messages_context, message_count, summary = await self.cache_repo.get_context(chat_id, limit=limit)
+        if message_count is None:
             last_messages = await self.message_repo.get_list(
-                limit=15,
+                limit=limit,
                 offset=0,
-                order_by="created_at desc",
+                order_by=["created_at desc", "id desc"],
                 chat_id=chat_id,
             )
-            messages_context = [{
-                "role": msg.role.value if isinstance(msg.role, Enum) else msg.role,
-                "content": [part.model_dump() for part in msg.content],
-            } for msg in reversed(last_messages)]
-            await self.cache_repo.set_messages(chat_id, messages_context)
-        return messages_context
-
-    @staticmethod
-    async def _safe_send(websocket: WebSocket, data: dict):
-        try:
-            await websocket.send_json(data)
-        except (WebSocketDisconnect, RuntimeError) as e:
-            if isinstance(e, RuntimeError) and 'close message' not in str(e):
-                raise
+            messages_context = []
+            for msg in reversed(last_messages):
+                message = {
+                    "role": msg.role.value if isinstance(msg.role, Enum) else msg.role,
+                    "content": [part.model_dump() for part in msg.content],
+                }
+                message["tokens"] = msg.token_count or count_message_tokens(message)
+                messages_context.append(message)
+            chat = await self.chat_repo.get_one(id=chat_id, schema_cls=ChatSessionSummarySchema)
+            message_count = chat.message_count
+            summary = None
+            if latest_summary := await self.summary_repo.get_latest(chat_id):
+                summary = {
+                    "summary": latest_summary.summary,
+                    "anchor_index": latest_summary.anchor_index or 0,
+                    "tokens": count_text_tokens(latest_summary.summary),
+                }
+            await self.cache_repo.set_messages(chat_id, messages_context, message_count, summary)
+        return messages_context, message_count, summary
 
     async def close_client(self):
         await self.client.aclose()
@@ -160,6 +327,52 @@ def get_chat_service(
         chat_repo: Annotated[ChatSessionRepository, Depends(get_chat_repository)],
         message_repo: Annotated[ChatMessageRepository, Depends(get_message_repository)],
         redis_cache: Annotated[RedisChatCache, Depends(get_redis_cache)],
-        client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+        client: Annotated[LLMTransport, Depends(get_llm_transport)],
+        summary_repo: Annotated[ChatSummaryRepository, Depends(get_summary_repository)],
+        message_writer: Annotated[MessageWriteBehind | None, Depends(get_message_writer)],
+        summarizer: Annotated[ChatSummarizer | None, Depends(get_chat_summarizer)],
+        retriever: Annotated[MessageRetriever | None, Depends(get_message_retriever)],
+        completion_cache: Annotated[CompletionCache | None, Depends(get_completion_cache)],
+        ingestor: Annotated[DocumentIngestor | None, Depends(get_document_ingestor)],
+        image_optimizer: Annotated[ImageOptimizer | None, Depends(get_image_optimizer)],
+        file_repo: Annotated[FileRepository, Depends(get_file_repository)],
 ) -> ChatService:
-    return ChatService(chat_repo, message_repo, redis_cache, client)
+    return ChatService(
+        chat_repo,
+        message_repo,
+        redis_cache,
+        client,
+        summary_repo,
+        message_writer,
+        summarizer,
+        retriever,
+        completion_cache,
+        ingestor,
+        image_optimizer,
+        file_repo,
+    )
+
+
+@asynccontextmanager
+async def chat_service_scope() -> AsyncGenerator[ChatService, None]:
+    # отдельная сессия БД на каждую генерацию: AsyncSession нельзя делить между конкурентными задачами
+    async with async_session_maker() as session:
+        try:
+            yield ChatService(
+                ChatSessionRepository(session),
+                ChatMessageRepository(session),
+                await get_redis_cache(),
+                get_llm_transport(),
+                ChatSummaryRepository(session),
+                get_message_writer(),
+                get_chat_summarizer(),
+                get_message_retriever(),
+                await get_completion_cache(),
+                get_document_ingestor(),
+                get_image_optimizer(),
+                FileRepository(session),
+            )
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import status
+from fastapi.websockets import WebSocket, WebSocketDisconnect
+
+from app.chat.schemas import StreamParamsSchema
+from app.chat.services import chat_service_scope
+from app.config.main import settings
+from app.managers.admission import AdmissionController, AdmissionError, get_admission_controller
+from app.managers.connections import ClientConnection, ConnectionManager, get_ws_manager
+from app.utils.serialization import serializer
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSocketSession:
+    def __init__(
+            self,
+            websocket: WebSocket,
+            connection: ClientConnection,
+            stream_params: StreamParamsSchema,
+            admission: Optional[AdmissionController] = None,
+            max_generations: Optional[int] = None,
+            ws_manager: Optional[ConnectionManager] = None,
+    ):
+        self.websocket = websocket
+        self.connection = connection
+        self.stream_params = stream_params
+        self.admission = admission or get_admission_controller()
+        self.ws_manager = ws_manager or get_ws_manager()
+        self.max_generations = max_generations or settings.chat.GENERATION_MAX_PER_CONNECTION
+        self._generations: Dict[str, asyncio.Task] = {}
+        self._busy_chats: Dict[uuid.UUID, str] = {}
+
+    async def run(self):
+        try:
+            while True:
+                data = serializer.loads(await self.websocket.receive_text())
+                match data.get("type"):
+                    case "message" if data.get("message"):
+                        self._start_generation(data)
+                    case "cancel":
+                        await self._cancel(data.get("request_id"))
+                    case _:
+                        await self.websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                        return
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            # клиент ушёл — незачем дальше тратить апстрим на его генерации
+            tasks = list(self._generations.values())
+            for task in tasks:
+                task.cancel()
+            # ждём, пока генерации закроют сессии БД и scope, и только потом отпускаем сокет
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start_generation(self, data: Dict[str, Any]):
+        request_id = str(data.get("request_id") or uuid.uuid4())
+        message = data["message"]
+        try:
+            chat_id = uuid.UUID(message.get("chat_id"))
+        except (TypeError, ValueError):
+            self._send(request_id, {"type": "error", "detail": "Invalid chat_id"})
+            return
+        if request_id in self._generations or chat_id in self._busy_chats:
+            self._send(request_id, {"type": "error", "detail": "Generation is already running"})
+            return
+        # один сокет не должен занимать все слоты admission генерациями в разных чатах
+        if len(self._generations) >= self.max_generations:
+            self._send(request_id, {"type": "error", "detail": "Too many concurrent generations"})
+            return
+        task = asyncio.create_task(self._generate(
+            request_id,
+            model=data.get("model"),
+            chat_id=chat_id,
+            user_content=message.get("content"),
+            use_cache=bool(data.get("cache")),
+        ))
+        self._generations[request_id] = task
+        self._busy_chats[chat_id] = request_id
+        task.add_done_callback(lambda _: self._finish(request_id, chat_id))
+
+    async def _cancel(self, request_id: str | None):
+        if request_id and (task := self._generations.get(str(request_id))):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _finish(self, request_id: str, chat_id: uuid.UUID):
+        self._generations.pop(request_id, None)
+        self._busy_chats.pop(chat_id, None)
+
+    async def _generate(
+            self,
+            request_id: str,
+            model: str,
+            chat_id: uuid.UUID,
+            user_content: Any,
+            use_cache: bool,
+    ):
+        async def send(frame: dict):
+            self._send(request_id, frame)
+
+        def on_position(position: int):
+            self._send(request_id, {"type": "queued", "position": position})
+
+        try:
+            # слот берём до открытия сессии БД, чтобы очередь не держала соединения пула
+            async with self.admission.admit(self.connection.user_id, on_position):
+                async with chat_service_scope() as chat_serv:
+                    # write-behind вставляет сообщения позже и пачкой: чужой или несуществующий чат
+                    # должен отсекаться до постановки в очередь
+                    if not await chat_serv.has_chat_access(chat_id, self.connection.user_id):
+                        self._send(request_id, {"type": "error", "detail": "Chat not found"})
+                        return
+                    await chat_serv.process_user_message(
+                        model=model,
+                        chat_id=chat_id,
+                        user_id=self.connection.user_id,
+                        user_content=user_content,
+                        send=send,
+                        stream_params=self.stream_params,
+                        use_cache=use_cache,
+                    )
+            await self._notify_chat_updated(request_id, chat_id)
+        except AdmissionError as e:
+            self._send(request_id, {"type": "rejected", "detail": e.detail, "retry_after": e.retry_after})
+        except asyncio.CancelledError:
+            self._send(request_id, {"type": "cancelled"})
+            raise
+        except Exception:
+            # текст исключения может содержать SQL и адреса апстрима, клиенту отдаём только общий ответ
+            logger.exception("Generation %s failed", request_id)
+            self._send(request_id, {"type": "error", "detail": "Generation failed"})
+
+    async def _notify_chat_updated(self, request_id: str, chat_id: uuid.UUID):
+        # остальные устройства пользователя могут быть подключены к другим воркерам,
+        # поэтому событие идёт через send_to_user, а не в текущий сокет
+        try:
+            await self.ws_manager.send_to_user(self.connection.user_id, {
+                "type": "chat_updated",
+                "chat_id": str(chat_id),
+                "request_id": request_id,
+            })
+        except Exception:
+            # ответ уже доставлен и сохранён, сбой уведомления не должен превращаться в ошибку генерации
+            logger.warning("Failed to notify devices about chat %s", chat_id, exc_info=True)
+
+    def _send(self, request_id: str, frame: dict):
+        self.connection.send({**frame, "request_id": request_id})
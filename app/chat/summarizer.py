@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.chat.repositories import ChatMessageRepository, ChatSummaryRepository
+from app.chat.schemas import ChatMessageSchema
+from app.config.main import settings
+from app.database.pg_client import async_session_maker
+from app.database.redis_client import RedisChatCache, redis_chat_cache
+from app.managers.client import get_http_client
+from app.utils.openai import count_text_tokens
+from app.utils.serialization import serializer
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You compress chat history. Write a concise summary of the conversation below, keeping facts, "
+    "decisions, names, numbers and open questions the assistant may need later. "
+    "Write in the language of the conversation."
+)
+
+
+class ChatSummarizer:
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            cache_repo: RedisChatCache,
+            client: httpx.AsyncClient,
+            model: str,
+            trigger_messages: int = 40,
+            keep_messages: int = 20,
+            max_tokens: int = 512,
+    ):
+        self._session_maker = session_maker
+        self.cache_repo = cache_repo
+        self.client = client
+        self.model = model
+        self.trigger_messages = trigger_messages
+        self.keep_messages = keep_messages
+        self.max_tokens = max_tokens
+        self._in_progress: Set[uuid.UUID] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def maybe_schedule(
+            self,
+            chat_id: uuid.UUID,
+            message_count: Optional[int],
+            summary: Optional[Dict[str, Any]],
+    ):
+        if message_count is None or chat_id in self._in_progress:
+            return
+        anchor = summary["anchor_index"] if summary else 0
+        if message_count - anchor < self.trigger_messages + self.keep_messages:
+            return
+        self._in_progress.add(chat_id)
+        task = asyncio.create_task(self._summarize(chat_id, message_count - self.keep_messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _summarize(self, chat_id: uuid.UUID, anchor_index: int):
+        try:
+            async with self._session_maker() as session:
+                summary_repo = ChatSummaryRepository(session)
+                previous = await summary_repo.get_latest(chat_id)
+                start = (previous.anchor_index or 0) if previous else 0
+                if anchor_index <= start:
+                    return
+                messages = await ChatMessageRepository(session).get_list(
+                    limit=anchor_index - start,
+                    offset=start,
+                    order_by=["created_at", "id"],
+                    chat_id=chat_id,
+                )
+                # при write-behind часть сообщений может быть ещё не записана — попробуем в следующий раз
+                if len(messages) < anchor_index - start:
+                    return
+                text = await self._request_summary(previous.summary if previous else None, messages)
+                await summary_repo.add(chat_id=chat_id, summary=text, anchor_index=anchor_index)
+                await session.commit()
+            await self.cache_repo.set_summary(chat_id, {
+                "summary": text,
+                "anchor_index": anchor_index,
+                "tokens": count_text_tokens(text),
+            })
+        except Exception:
+            # задачу никто не ждёт: любое исключение здесь иначе всплыло бы только как never retrieved
+            logger.exception("Failed to summarize chat %s", chat_id)
+        finally:
+            self._in_progress.discard(chat_id)
+
+    async def _request_summary(
+            self,
+            previous_summary: Optional[str],
+            messages: List[ChatMessageSchema],
+    ) -> str:
+        transcript = "\n".join(self._format_message(msg) for msg in messages)
+        if previous_summary:
+            transcript = f"Previous summary:\n{previous_summary}\n\nNew messages:\n{transcript}"
+        payload = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+        }
+        response = await self.client.post("chat/completions", json=payload)
+        response.raise_for_status()
+        try:
+            content = serializer.loads(response.content)["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ValueError("Malformed summary response") from e
+        # пустое саммари сдвинуло бы якорь и выбросило историю из контекста
+        if not isinstance(content, str) or not content.strip():
+            raise ValueError("Summary response has no content")
+        return content.strip()
+
+    @staticmethod
+    def _format_message(message: ChatMessageSchema) -> str:
+        items = message.content if isinstance(message.content, list) else [message.content]
+        parts = [item.text if item.text else f"[{item.type.value}]" for item in items]
+        return f"{message.role.value}: {' '.join(parts)}"
+
+
+chat_summarizer = ChatSummarizer(
+    async_session_maker,
+    redis_chat_cache,
+    get_http_client(),
+    model=settings.chat.SUMMARY_MODEL,
+    trigger_messages=settings.chat.SUMMARY_TRIGGER_MESSAGES,
+    keep_messages=settings.chat.SUMMARY_KEEP_MESSAGES,
+    max_tokens=settings.chat.SUMMARY_MAX_TOKENS,
+)
+
+
+def get_chat_summarizer() -> ChatSummarizer | None:
+    if not settings.chat.SUMMARY_ENABLED:
+        return None
+    return chat_summarizer
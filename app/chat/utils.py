@@ -0,0 +1,40 @@
+import uuid
+from typing import Any, Dict, List, Optional, Union
+
+PREVIEW_LENGTH = 255
+
+
+def message_preview(
+        content: Union[Dict[str, Any], List[Dict[str, Any]]],
+        length: int = PREVIEW_LENGTH,
+) -> Optional[str]:
+    items = content if isinstance(content, list) else [content]
+    for item in items:
+        if item.get("type") == "text" and item.get("text"):
+            return item["text"][:length]
+    for item in items:
+        if item.get("type"):
+            return f"[{item['type']}]"
+    return None
+
+
+def message_text(content: Union[str, Dict[str, Any], List[Dict[str, Any]]]) -> str:
+    if isinstance(content, str):
+        return content
+    items = content if isinstance(content, list) else [content]
+    return "\n".join(item["text"] for item in items if item.get("type") == "text" and item.get("text"))
+
+
+def attached_file_ids(content: Union[str, Dict[str, Any], List[Dict[str, Any]]]) -> List[uuid.UUID]:
+    if isinstance(content, str):
+        return []
+    items = content if isinstance(content, list) else [content]
+    file_ids = []
+    for item in items:
+        if item.get("type") != "file":
+            continue
+        try:
+            file_ids.append(uuid.UUID(str((item.get("meta") or {})["file_id"])))
+        except (KeyError, ValueError):
+            continue
+    return file_ids
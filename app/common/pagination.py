@@ -0,0 +1,24 @@
+import base64
+import datetime
+import uuid
+from typing import Any, Tuple
+
+from app.utils.serialization import serializer
+
+
+def encode_cursor(value: Any, instance_id: uuid.UUID) -> str:
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    raw = serializer.dumps([value, str(instance_id)])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, python_type: type) -> Tuple[Any, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, instance_id = serializer.loads(raw)
+        if python_type is datetime.datetime:
+            value = datetime.datetime.fromisoformat(value)
+        return value, uuid.UUID(instance_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
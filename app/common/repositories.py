@@ -1,12 +1,14 @@
-from typing import Any, Generic, List, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from pydantic import BaseModel
-from sqlalchemy import asc, desc, func, select
+from sqlalchemy import asc, delete, desc, func, select, tuple_, update
 from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeMeta, selectinload
 from sqlalchemy.sql import operators
 
+from app.common.pagination import decode_cursor, encode_cursor
 from app.common.schemas import OrmModel
 
 T = TypeVar("T", bound=DeclarativeMeta)
@@ -69,6 +71,45 @@ class BaseRepository(Generic[T, S]):
         instances = result.scalars().all()
         return [(schema_cls or self.schema).model_validate(instance) for instance in instances]
 
+    async def get_cursor_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        cursor_field: str = "created_at",
+        descending: bool = True,
+        joined: Optional[list[str]] = None,
+        schema_cls: Optional[Type[BaseModel]] = None,
+        **filter_by: Any,
+    ) -> Tuple[List[S], Optional[str]]:
+        if not hasattr(self.model, cursor_field):
+            raise ValueError(f"Invalid cursor field: {cursor_field}")
+        column = getattr(self.model, cursor_field)
+        key = tuple_(column, self.model.id)
+
+        query = select(self.model)
+        query = self._apply_joins(query, joined)
+        filters = self._build_filters(filter_by)
+        if cursor:
+            value, instance_id = decode_cursor(cursor, column.type.python_type)
+            bound = tuple_(value, instance_id)
+            filters.append(key < bound if descending else key > bound)
+        query = query.filter(*filters)
+        if descending:
+            query = query.order_by(desc(column), desc(self.model.id))
+        else:
+            query = query.order_by(asc(column), asc(self.model.id))
+        query = query.limit(limit + 1)
+
+        result = await self.session.execute(query)
+        instances = result.scalars().all()
+        next_cursor = None
+        if len(instances) > limit:
+            instances = instances[:limit]
+            last = instances[-1]
+            next_cursor = encode_cursor(getattr(last, cursor_field), last.id)
+        items = [(schema_cls or self.schema).model_validate(instance) for instance in instances]
+        return items, next_cursor
+
     async def get_total_count(self, **filter_by: Any) -> int:
         filters = self._build_filters(filter_by)
         query = select(func.count()).select_from(self.model).filter(*filters)
@@ -76,11 +117,65 @@ class BaseRepository(Generic[T, S]):
         return result.scalar_one()
 
     async def add(self, **data: Any) -> S:
-        instance = self.model(**data)
-        self.session.add(instance)
-        await self.session.flush()
-        await self.session.refresh(instance)
-        return self.schema.model_validate(instance)
+        # один INSERT ... RETURNING вместо flush и отдельного SELECT в refresh
+        query = insert(self.model).values(**data).returning(self.model)
+        result = await self.session.execute(query)
+        return self.schema.model_validate(result.scalars().one())
+
+    async def add_many(self, rows: Sequence[Dict[str, Any]], returning: bool = True) -> List[S]:
+        if not rows:
+            return []
+        if not returning:
+            # без RETURNING драйвер отправляет пачку через executemany asyncpg
+            await self.session.execute(insert(self.model), list(rows))
+            return []
+        # insertmanyvalues: многострочный VALUES ... RETURNING страницами, строки в порядке входных данных
+        query = insert(self.model).returning(self.model, sort_by_parameter_order=True)
+        result = await self.session.execute(query, list(rows))
+        return [self.schema.model_validate(instance) for instance in result.scalars().all()]
+
+    async def upsert(
+        self,
+        rows: Union[Dict[str, Any], Sequence[Dict[str, Any]]],
+        conflict: Sequence[str],
+        update_fields: Optional[Sequence[str]] = None,
+        set_: Optional[Dict[str, Any]] = None,
+    ) -> List[S]:
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return []
+        query = insert(self.model)
+        values = {field: getattr(query.excluded, field) for field in update_fields or ()}
+        values.update(set_ or {})
+        if values:
+            # одна команда не может обновить строку дважды: из дублей по ключу оставляем последний
+            rows = list({tuple(row[field] for field in conflict): row for row in rows}.values())
+            query = query.on_conflict_do_update(index_elements=list(conflict), set_=values)
+            query = query.returning(self.model, sort_by_parameter_order=len(rows) > 1)
+        else:
+            # без обновляемых полей RETURNING вернёт только реально вставленные строки, порядок не гарантирован
+            query = query.on_conflict_do_nothing(index_elements=list(conflict)).returning(self.model)
+        if len(rows) == 1:
+            result = await self.session.execute(query.values(**rows[0]))
+        else:
+            result = await self.session.execute(query, rows)
+        return [self.schema.model_validate(instance) for instance in result.scalars().all()]
+
+    async def update_where(self, values: Dict[str, Any], **filter_by: Any) -> List[S]:
+        if not filter_by:
+            raise ValueError("update_where requires at least one filter")
+        filters = self._build_filters(filter_by)
+        query = update(self.model).filter(*filters).values(**values).returning(self.model)
+        result = await self.session.execute(query)
+        return [self.schema.model_validate(instance) for instance in result.scalars().all()]
+
+    async def delete_where(self, **filter_by: Any) -> List[S]:
+        if not filter_by:
+            raise ValueError("delete_where requires at least one filter")
+        filters = self._build_filters(filter_by)
+        query = delete(self.model).filter(*filters).returning(self.model)
+        result = await self.session.execute(query)
+        return [self.schema.model_validate(instance) for instance in result.scalars().all()]
 
     def _build_filters(self, filter_kwargs: dict) -> list:
         conditions = []
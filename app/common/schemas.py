@@ -1,5 +1,5 @@
 import uuid
-from typing import Generic, List, TypeVar
+from typing import Generic, List, Optional, TypeVar
 
 from pydantic import BaseModel
 from pydantic.v1.generics import GenericModel
@@ -14,6 +14,11 @@ class PaginatedResponse(GenericModel, Generic[T]):
     offset: int
 
 
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
 class OrmModel(BaseModel):
     id: uuid.UUID
 
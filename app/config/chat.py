@@ -0,0 +1,100 @@
+from typing import Dict, Optional
+
+from pydantic import model_validator
+from pydantic_settings import BaseSettings
+
+
+class ChatConfig(BaseSettings):
+    STREAM_FLUSH_INTERVAL_MS: int = 50
+    STREAM_FLUSH_BYTES: int = 256
+    STREAM_FLUSH_ON_SENTENCE: bool = True
+
+    HISTORY_CACHE_WINDOW: Optional[int] = 64
+    HISTORY_CACHE_TTL: Optional[int] = 60 * 60 * 24
+    HISTORY_CONTEXT_MESSAGES: int = 64
+
+    MODEL_CONTEXT_TOKENS: Dict[str, int] = {"gpt-4": 8192}
+    DEFAULT_CONTEXT_TOKENS: int = 8192
+    COMPLETION_RESERVE_TOKENS: int = 1024
+
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_TRIGGER_MESSAGES: int = 40
+    SUMMARY_KEEP_MESSAGES: int = 20
+    SUMMARY_MODEL: str = "gpt-4"
+    SUMMARY_MAX_TOKENS: int = 512
+
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 1536
+    EMBEDDING_BATCH_SIZE: int = 64
+
+    RETRIEVAL_ENABLED: bool = False
+    RETRIEVAL_COLLECTION: str = "chat_messages"
+    RETRIEVAL_TOP_K: int = 4
+    RETRIEVAL_MIN_SCORE: float = 0.3
+    RETRIEVAL_MAX_TOKENS: int = 1024
+    RETRIEVAL_QUEUE_SIZE: int = 10000
+
+    FILE_INGESTION_ENABLED: bool = False
+    FILE_COLLECTION: str = "file_chunks"
+    FILE_CHUNK_TOKENS: int = 400
+    FILE_CHUNK_OVERLAP_TOKENS: int = 50
+    FILE_MAX_BYTES: int = 20 * 1024 * 1024
+    FILE_INGEST_WORKERS: int = 2
+    FILE_INGEST_QUEUE_SIZE: int = 1000
+    FILE_RETRIEVAL_TOP_K: int = 6
+    FILE_RETRIEVAL_MIN_SCORE: float = 0.2
+    FILE_RETRIEVAL_MAX_TOKENS: int = 1536
+
+    # варианты отдаются модели подписанными ссылками на MINIO_PUBLIC_URL: без него включать бессмысленно
+    IMAGE_OPTIMIZATION_ENABLED: bool = False
+    IMAGE_FORMAT: str = "webp"
+    IMAGE_QUALITY: int = 80
+    IMAGE_MAX_SIDE: int = 2048
+    IMAGE_MAX_SHORT_SIDE: int = 768
+    IMAGE_LOW_MAX_SIDE: int = 512
+    IMAGE_MAX_BYTES: int = 20 * 1024 * 1024
+    IMAGE_WORKERS: int = 2
+    IMAGE_CACHE_SIZE: int = 10000
+
+    COMPLETION_CACHE_ENABLED: bool = False
+    COMPLETION_CACHE_TTL: int = 60 * 60 * 24
+    COMPLETION_CACHE_MAX_ENTRIES: int = 100000
+    COMPLETION_CACHE_MAX_BYTES: int = 64 * 1024
+
+    JSON_BACKEND: str = "orjson"
+
+    WS_DISTRIBUTED: bool = False
+    WS_PRESENCE_TTL: int = 60
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT: float = 5.0
+    WS_OVERFLOW_POLICY: str = "merge"
+
+    GENERATION_MAX_CONCURRENT: int = 64
+    GENERATION_MAX_PER_CONNECTION: int = 4
+    GENERATION_QUEUE_SIZE: int = 1024
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_USER_BURST: int = 5
+    RATE_LIMIT_USER_PER_MINUTE: float = 20
+    RATE_LIMIT_GLOBAL_BURST: int = 0
+    RATE_LIMIT_GLOBAL_PER_MINUTE: float = 0
+
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_QUEUE_SIZE: int = 10000
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL_MS: int = 100
+    WRITE_BEHIND_MAX_RETRIES: int = 3
+
+    @model_validator(mode="after")
+    def check_history_window(self):
+        # хвост после якоря саммари доходит до TRIGGER + KEEP сообщений и должен целиком
+        # помещаться в загружаемую историю, иначе сообщения между саммари и историей пропадут
+        summary_window = self.SUMMARY_TRIGGER_MESSAGES + self.SUMMARY_KEEP_MESSAGES
+        if self.SUMMARY_ENABLED and self.HISTORY_CONTEXT_MESSAGES < summary_window:
+            raise ValueError("HISTORY_CONTEXT_MESSAGES must be >= SUMMARY_TRIGGER_MESSAGES + SUMMARY_KEEP_MESSAGES")
+        if self.HISTORY_CACHE_WINDOW and self.HISTORY_CACHE_WINDOW < self.HISTORY_CONTEXT_MESSAGES:
+            raise ValueError("HISTORY_CACHE_WINDOW must be >= HISTORY_CONTEXT_MESSAGES")
+        return self
+
+    class Config:
+        env_file = ".env"
+        extra = "allow"
@@ -9,6 +9,9 @@ class DatabaseConfig(BaseSettings):
     POSTGRES_USER: str = 'postgres'
     POSTGRES_PASSWORD: str = 'postgres'
     POSTGRES_DB: str = 'postgres'
+    POSTGRES_POOL_SIZE: int = 20
+    POSTGRES_MAX_OVERFLOW: int = 44
+    POSTGRES_POOL_TIMEOUT: float = 10.0
     # TEST_POSTGRES_DB: str
 
     REDIS_HOST: str = "localhost"
@@ -18,12 +21,21 @@ class DatabaseConfig(BaseSettings):
 
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
+    VECTOR_BACKEND: str = "qdrant"
 
     MINIO_USER: str = 'minioadmin'
     MINIO_PASSWORD: str = 'minioadmin'
     MINIO_HOST: str = 'localhost'
     MINIO_PORT: int = 9000
     MINIO_BUCKET_NAME: str = 'minio'
+    MINIO_PART_SIZE: int = 8 * 1024 * 1024
+    MINIO_UPLOAD_CONCURRENCY: int = 4
+    MINIO_MAX_POOL_CONNECTIONS: int = 50
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 60.0
+    MINIO_PUBLIC_URL: Optional[str] = None
+    MINIO_UPLOAD_SESSION_TTL: int = 60 * 60
+    MINIO_DOWNLOAD_URL_TTL: int = 15 * 60
 
     @property
     def POSTGRES_URL(self) -> str:
@@ -43,7 +55,7 @@ class DatabaseConfig(BaseSettings):
 
     @property
     def QDRANT_URL(self) -> str:
-        return f"http://{self.host}:{self.port}"
+        return f"http://{self.QDRANT_HOST}:{self.QDRANT_PORT}"
 
     @property
     def MINIO_URL(self) -> str:
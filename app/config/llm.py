@@ -0,0 +1,28 @@
+from pydantic_settings import BaseSettings
+
+
+class LLMConfig(BaseSettings):
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_HTTP2: bool = False
+
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_WRITE_TIMEOUT: float = 10.0
+    LLM_POOL_TIMEOUT: float = 5.0
+    LLM_FIRST_BYTE_TIMEOUT: float = 30.0
+    LLM_INTER_TOKEN_TIMEOUT: float = 30.0
+
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BACKOFF: float = 0.2
+
+    LLM_BREAKER_THRESHOLD: int = 5
+    LLM_BREAKER_COOLDOWN: float = 30.0
+
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
+    class Config:
+        env_file = ".env"
+        extra = "allow"
@@ -1,4 +1,6 @@
+from app.config.chat import ChatConfig
 from app.config.database import DatabaseConfig
+from app.config.llm import LLMConfig
 from app.config.security import SecurityConfig
 
 
@@ -6,6 +8,12 @@ class Settings:
     def __init__(self):
         self.database = DatabaseConfig()
         self.security = SecurityConfig()
+        self.chat = ChatConfig()
+        self.llm = LLMConfig()
+        # каждая допущенная генерация на время подготовки и сохранения берёт соединение из пула
+        pool_limit = self.database.POSTGRES_POOL_SIZE + self.database.POSTGRES_MAX_OVERFLOW
+        if self.chat.GENERATION_MAX_CONCURRENT > pool_limit:
+            raise ValueError("GENERATION_MAX_CONCURRENT must be <= POSTGRES_POOL_SIZE + POSTGRES_MAX_OVERFLOW")
 
 
 settings = Settings()
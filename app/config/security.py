@@ -7,6 +7,17 @@ class SecurityConfig(BaseSettings):
     OPENAI_URL: str
     OPENAI_API_KEY: str
 
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 300
+    USER_CACHE_TTL: int = 300
+    USER_LOCAL_CACHE_SIZE: int = 10000
+    USER_LOCAL_CACHE_TTL: int = 5
+
+    VERIFY_CODE_TTL: int = 5 * 60
+    VERIFY_CODE_RESEND_INTERVAL: int = 60
+    VERIFY_CODE_MAX_ATTEMPTS: int = 5
+
     class Config:
         env_file = ".env"
         extra = "allow"
@@ -7,7 +7,13 @@ from app.config.main import settings
 
 DB_URL = settings.database.POSTGRES_URL
 
-engine = create_async_engine(DB_URL, pool_pre_ping=True)
+engine = create_async_engine(
+    DB_URL,
+    pool_pre_ping=True,
+    pool_size=settings.database.POSTGRES_POOL_SIZE,
+    max_overflow=settings.database.POSTGRES_MAX_OVERFLOW,
+    pool_timeout=settings.database.POSTGRES_POOL_TIMEOUT,
+)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
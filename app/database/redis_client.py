@@ -1,49 +1,336 @@
-import json
+import hashlib
+import time
 import uuid
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import redis.asyncio as redis
 
 from app.config.main import settings
+from app.utils.serialization import serializer
 
 
 class RedisChatCache:
-    def __init__(self, redis_client: redis.Redis):
+    # счётчик без meta не восстанавливаем: HINCRBY начал бы с нуля и сдвинул якорь саммари,
+    # поэтому сбрасываем кэш целиком, и следующее чтение пересоберёт его из БД
+    APPEND_SCRIPT = """
+    if redis.call('HEXISTS', KEYS[2], 'count') == 0 then
+        redis.call('DEL', KEYS[1], KEYS[2])
+        return false
+    end
+    for i = 3, #ARGV do
+        redis.call('RPUSH', KEYS[1], ARGV[i])
+    end
+    local count = redis.call('HINCRBY', KEYS[2], 'count', #ARGV - 2)
+    local window = tonumber(ARGV[1])
+    if window > 0 then
+        redis.call('LTRIM', KEYS[1], -window, -1)
+    end
+    local ttl = tonumber(ARGV[2])
+    if ttl > 0 then
+        redis.call('EXPIRE', KEYS[1], ttl)
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+    return count
+    """
+
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            window: Optional[int] = None,
+            ttl: Optional[int] = None,
+    ):
         self.redis = redis_client
+        self.window = window
+        self.ttl = ttl
+        self._append = redis_client.register_script(self.APPEND_SCRIPT)
 
     @staticmethod
     def _get_key(chat_id: uuid.UUID) -> str:
         return f"chat:{chat_id}:messages"
 
-    async def set_messages(self, chat_id: uuid.UUID, messages: List[Dict]):
-        key = self._get_key(chat_id)
-        await self.redis.delete(key)
-        if not messages:
-            return
-        messages_json = [json.dumps(msg, ensure_ascii=False) for msg in messages]
-        await self.redis.rpush(key, *messages_json)
+    @staticmethod
+    def _get_meta_key(chat_id: uuid.UUID) -> str:
+        return f"chat:{chat_id}:meta"
 
-    async def append_message(self, chat_id: uuid.UUID, message: Dict):
+    async def set_messages(
+            self,
+            chat_id: uuid.UUID,
+            messages: List[Dict],
+            count: Optional[int] = None,
+            summary: Optional[Dict] = None,
+    ):
         key = self._get_key(chat_id)
-        message_json = json.dumps(message, ensure_ascii=False)
-        await self.redis.rpush(key, message_json)
+        meta_key = self._get_meta_key(chat_id)
+        meta = {}
+        if count is not None:
+            meta["count"] = count
+        if summary:
+            meta["summary"] = serializer.dumps(summary)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key, meta_key)
+            if messages:
+                messages_json = [serializer.dumps(msg) for msg in messages]
+                pipe.rpush(key, *messages_json)
+            if meta:
+                pipe.hset(meta_key, mapping=meta)
+            self._bound(pipe, key, meta_key)
+            await pipe.execute()
+
+    async def append_message(self, chat_id: uuid.UUID, message: Dict) -> Optional[int]:
+        return await self.append_messages(chat_id, [message])
+
+    async def append_messages(self, chat_id: uuid.UUID, messages: List[Dict]) -> Optional[int]:
+        if not messages:
+            return None
+        count = await self._append(
+            keys=[self._get_key(chat_id), self._get_meta_key(chat_id)],
+            args=[self.window or 0, self.ttl or 0, *(serializer.dumps(msg) for msg in messages)],
+        )
+        return int(count) if count is not None else None
 
     async def get_last_messages(self, chat_id: uuid.UUID, limit: int = 15) -> List[Dict]:
+        messages, _, _ = await self.get_context(chat_id, limit)
+        return messages
+
+    async def get_context(
+            self,
+            chat_id: uuid.UUID,
+            limit: int = 15,
+    ) -> Tuple[List[Dict], Optional[int], Optional[Dict]]:
         key = self._get_key(chat_id)
-        length = await self.redis.llen(key)
-        if length == 0:
-            return []
-        start = max(0, length - limit)
-        end = length - 1
-        messages_json = await self.redis.lrange(key, start, end)
-        return [json.loads(msg) for msg in messages_json]
+        meta_key = self._get_meta_key(chat_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(key, -limit, -1)
+            pipe.hgetall(meta_key)
+            if self.ttl:
+                pipe.expire(key, self.ttl)
+                pipe.expire(meta_key, self.ttl)
+            messages_json, meta, *_ = await pipe.execute()
+        count = int(meta["count"]) if "count" in meta else None
+        summary = serializer.loads(meta["summary"]) if "summary" in meta else None
+        return [serializer.loads(msg) for msg in messages_json], count, summary
+
+    async def set_summary(self, chat_id: uuid.UUID, summary: Dict):
+        meta_key = self._get_meta_key(chat_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(meta_key, "summary", serializer.dumps(summary))
+            if self.ttl:
+                pipe.expire(meta_key, self.ttl)
+            await pipe.execute()
+
+    def _bound(self, pipe: redis.client.Pipeline, key: str, meta_key: str):
+        if self.window:
+            pipe.ltrim(key, -self.window, -1)
+        if self.ttl:
+            pipe.expire(key, self.ttl)
+            pipe.expire(meta_key, self.ttl)
 
     async def close(self):
         await self.redis.close()
 
 
+class CompletionCache:
+    INDEX_KEY = "completion:index"
+
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            ttl: int,
+            max_entries: int,
+            max_bytes: int,
+    ):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], params: Optional[Dict[str, Any]] = None) -> str:
+        normalized = serializer.dumps(
+            {"model": model, "messages": CompletionCache._normalize(messages), "params": params or {}},
+            sort_keys=True,
+        )
+        return f"completion:{hashlib.sha256(normalized).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.zadd(self.INDEX_KEY, {key: time.time()}, xx=True)
+            answer, _ = await pipe.execute()
+        return answer
+
+    async def set(self, key: str, answer: str):
+        if len(answer.encode()) > self.max_bytes:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, answer, ex=self.ttl)
+            pipe.zadd(self.INDEX_KEY, {key: time.time()})
+            pipe.zcard(self.INDEX_KEY)
+            *_, size = await pipe.execute()
+        if size > self.max_entries:
+            evicted = await self.redis.zpopmin(self.INDEX_KEY, size - self.max_entries)
+            if evicted:
+                await self.redis.delete(*(evicted_key for evicted_key, _ in evicted))
+
+    @staticmethod
+    def _normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, list):
+            return [CompletionCache._normalize(item) for item in value]
+        if isinstance(value, dict):
+            return {key: CompletionCache._normalize(item) for key, item in value.items() if item is not None}
+        return value
+
+
+class RedisUserCache:
+    def __init__(self, redis_client: redis.Redis, ttl: int):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def _get_key(user_id: uuid.UUID) -> str:
+        return f"auth:user:{user_id}"
+
+    async def get(self, user_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        data = await self.redis.get(self._get_key(user_id))
+        return serializer.loads(data) if data is not None else None
+
+    async def set(self, user_id: uuid.UUID, user: Dict[str, Any]):
+        await self.redis.set(self._get_key(user_id), serializer.dumps(user), ex=self.ttl)
+
+    async def invalidate(self, user_id: uuid.UUID):
+        await self.redis.delete(self._get_key(user_id))
+
+
+class RedisUploadSessionStore:
+    def __init__(self, redis_client: redis.Redis, ttl: int):
+        self.redis = redis_client
+        self.ttl = ttl
+
+    @staticmethod
+    def _get_key(session_id: uuid.UUID) -> str:
+        return f"file:upload:{session_id}"
+
+    async def create(self, session: Dict[str, Any]) -> uuid.UUID:
+        session_id = uuid.uuid4()
+        await self.redis.set(self._get_key(session_id), serializer.dumps(session), ex=self.ttl)
+        return session_id
+
+    async def get(self, session_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+        data = await self.redis.get(self._get_key(session_id))
+        return serializer.loads(data) if data is not None else None
+
+    async def delete(self, session_id: uuid.UUID) -> bool:
+        return bool(await self.redis.delete(self._get_key(session_id)))
+
+
+class RedisVerifyCodeStore:
+    # код выдаётся, только если для email не истёк интервал повторной отправки
+    ISSUE_SCRIPT = """
+if redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[3]) then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'code', ARGV[1], 'attempts', 0)
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 0
+end
+-- TTL округляется вниз и в последнюю секунду даёт 0, а 0 означает «код выдан»
+return math.max(1, redis.call('TTL', KEYS[2]))
+"""
+    # сверка и удаление одним шагом: код нельзя использовать дважды или перебирать бесконечно
+    CONSUME_SCRIPT = """
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 0
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, redis_client: redis.Redis, ttl: int, resend_interval: int, max_attempts: int):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.resend_interval = resend_interval
+        self.max_attempts = max_attempts
+        self._issue = redis_client.register_script(self.ISSUE_SCRIPT)
+        self._consume = redis_client.register_script(self.CONSUME_SCRIPT)
+
+    @staticmethod
+    def _get_key(email: str) -> str:
+        return f"auth:code:{email}"
+
+    @staticmethod
+    def _get_throttle_key(email: str) -> str:
+        return f"auth:code:throttle:{email}"
+
+    # 0 — код сохранён, иначе сколько секунд ждать до повторной отправки
+    async def issue(self, email: str, code: str) -> int:
+        keys = [self._get_key(email), self._get_throttle_key(email)]
+        return int(await self._issue(keys=keys, args=[code, self.ttl, self.resend_interval]))
+
+    async def consume(self, email: str, code: str) -> bool:
+        return bool(await self._consume(keys=[self._get_key(email)], args=[code, self.max_attempts]))
+
+
 _redis_client = redis.from_url(settings.database.REDIS_URL, decode_responses=True)
 
 
+def get_redis_client() -> redis.Redis:
+    return _redis_client
+
+
+redis_chat_cache = RedisChatCache(
+    _redis_client,
+    window=settings.chat.HISTORY_CACHE_WINDOW,
+    ttl=settings.chat.HISTORY_CACHE_TTL,
+)
+
+
 async def get_redis_cache() -> RedisChatCache:
-    return RedisChatCache(_redis_client)
+    return redis_chat_cache
+
+
+completion_cache = CompletionCache(
+    _redis_client,
+    ttl=settings.chat.COMPLETION_CACHE_TTL,
+    max_entries=settings.chat.COMPLETION_CACHE_MAX_ENTRIES,
+    max_bytes=settings.chat.COMPLETION_CACHE_MAX_BYTES,
+)
+
+
+async def get_completion_cache() -> CompletionCache | None:
+    if not settings.chat.COMPLETION_CACHE_ENABLED:
+        return None
+    return completion_cache
+
+
+redis_user_cache = RedisUserCache(_redis_client, ttl=settings.security.USER_CACHE_TTL)
+
+
+async def get_user_cache() -> RedisUserCache:
+    return redis_user_cache
+
+
+verify_code_store = RedisVerifyCodeStore(
+    _redis_client,
+    ttl=settings.security.VERIFY_CODE_TTL,
+    resend_interval=settings.security.VERIFY_CODE_RESEND_INTERVAL,
+    max_attempts=settings.security.VERIFY_CODE_MAX_ATTEMPTS,
+)
+
+
+async def get_verify_code_store() -> RedisVerifyCodeStore:
+    return verify_code_store
+
+
+upload_session_store = RedisUploadSessionStore(_redis_client, ttl=settings.database.MINIO_UPLOAD_SESSION_TTL)
+
+
+async def get_upload_session_store() -> RedisUploadSessionStore:
+    return upload_session_store
@@ -1,18 +1,78 @@
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack
+from typing import Optional
 
 import aioboto3
+from aiobotocore.config import AioConfig
+from botocore.client import BaseClient
 
 from app.config.main import settings
 
 
-@asynccontextmanager
-async def get_s3_client():
-    session = aioboto3.Session()
-    async with session.client(
-        "s3",
-        aws_access_key_id=settings.database.MINIO_USER,
-        aws_secret_access_key=settings.database.MINIO_PASSWORD,
-        endpoint_url=settings.database.MINIO_URL,
-        region_name="us-east-1",
-    ) as client:
-        yield client
+class S3ClientManager:
+    def __init__(
+            self,
+            max_pool_connections: int = 50,
+            connect_timeout: float = 5.0,
+            read_timeout: float = 60.0,
+            public_url: Optional[str] = None,
+    ):
+        self.session = aioboto3.Session()
+        self.config = AioConfig(
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=True,
+            signature_version="s3v4",
+        )
+        self.public_url = public_url
+        self.client: Optional[BaseClient] = None
+        self.presign_client: Optional[BaseClient] = None
+        self._stack: Optional[AsyncExitStack] = None
+
+    async def start(self):
+        if self.client is not None:
+            return
+        self._stack = AsyncExitStack()
+        self.client = await self._stack.enter_async_context(self._create_client(settings.database.MINIO_URL))
+        # подпись включает host, поэтому ссылки для клиентов подписываем публичным адресом хранилища
+        if self.public_url and self.public_url != settings.database.MINIO_URL:
+            self.presign_client = await self._stack.enter_async_context(self._create_client(self.public_url))
+        else:
+            self.presign_client = self.client
+
+    async def close(self):
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = None
+        self.client = None
+        self.presign_client = None
+
+    def _create_client(self, endpoint_url: str):
+        return self.session.client(
+            "s3",
+            aws_access_key_id=settings.database.MINIO_USER,
+            aws_secret_access_key=settings.database.MINIO_PASSWORD,
+            endpoint_url=endpoint_url,
+            region_name="us-east-1",
+            config=self.config,
+        )
+
+
+s3_manager = S3ClientManager(
+    max_pool_connections=settings.database.MINIO_MAX_POOL_CONNECTIONS,
+    connect_timeout=settings.database.MINIO_CONNECT_TIMEOUT,
+    read_timeout=settings.database.MINIO_READ_TIMEOUT,
+    public_url=settings.database.MINIO_PUBLIC_URL,
+)
+
+
+def get_s3_client() -> BaseClient:
+    if s3_manager.client is None:
+        raise RuntimeError("S3 client is not started")
+    return s3_manager.client
+
+
+def get_s3_presign_client() -> BaseClient:
+    if s3_manager.presign_client is None:
+        raise RuntimeError("S3 client is not started")
+    return s3_manager.presign_client
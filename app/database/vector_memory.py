@@ -0,0 +1,150 @@
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from app.database.vector_store import VectorFilter, VectorHit, VectorPoint, VectorStore
+
+
+class _Collection:
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self.ids: List[uuid.UUID] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.rows: Dict[uuid.UUID, int] = {}
+        self.alive: Set[int] = set()
+        self.match_index: Dict[str, Dict[Any, Set[int]]] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[Set[int]] = []
+
+    def append(self, vector: np.ndarray, point: VectorPoint):
+        if point.id in self.rows:
+            self.remove(self.rows[point.id])
+        row = len(self.ids)
+        if row == self.vectors.shape[0]:
+            grown = np.zeros((max(16, row * 2), self.dimensions), dtype=np.float32)
+            grown[:row] = self.vectors[:row]
+            self.vectors = grown
+        self.vectors[row] = vector
+        self.ids.append(point.id)
+        self.payloads.append(point.payload)
+        self.rows[point.id] = row
+        self.alive.add(row)
+        for key, value in point.payload.items():
+            if isinstance(value, (str, int, bool)):
+                self.match_index.setdefault(key, {}).setdefault(value, set()).add(row)
+        if self.centroids is not None:
+            self.lists[self._nearest_centroids(vector, 1)[0]].add(row)
+
+    def remove(self, row: int):
+        self.alive.discard(row)
+        self.rows.pop(self.ids[row], None)
+        for key, value in self.payloads[row].items():
+            rows = self.match_index.get(key, {}).get(value)
+            if rows is not None:
+                rows.discard(row)
+        for rows in self.lists:
+            rows.discard(row)
+
+    def train(self, nlist: int, iterations: int = 10):
+        rows = np.fromiter(self.alive, dtype=np.int64)
+        data = self.vectors[rows]
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(rows), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for i in range(nlist):
+                members = data[assignment == i]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [set() for _ in range(nlist)]
+        for row, cluster in zip(rows.tolist(), assignment.tolist()):
+            self.lists[cluster].add(row)
+
+    def _nearest_centroids(self, vector: np.ndarray, count: int) -> List[int]:
+        scores = self.centroids @ vector
+        return np.argsort(-scores)[:count].tolist()
+
+    def candidates(self, vector: np.ndarray, filters: Optional[VectorFilter], nprobe: int) -> Set[int]:
+        rows = self.alive
+        if filters:
+            for key, value in filters.match.items():
+                rows = rows & self.match_index.get(key, {}).get(value, set())
+            for key, values in filters.any.items():
+                index = self.match_index.get(key, {})
+                rows = rows & set().union(*(index.get(value, set()) for value in values))
+        # IVF имеет смысл только для широких запросов: узкий фильтр быстрее перебрать целиком
+        if self.centroids is not None and len(rows) > len(self.alive) // max(1, len(self.lists)):
+            probed = set().union(*(self.lists[i] for i in self._nearest_centroids(vector, nprobe)))
+            rows = rows & probed
+        if filters and filters.lt:
+            rows = {
+                row for row in rows
+                if all(
+                    key in self.payloads[row] and self.payloads[row][key] < bound
+                    for key, bound in filters.lt.items()
+                )
+            }
+        return rows
+
+
+class InMemoryVectorStore(VectorStore):
+    def __init__(self, nlist: int = 64, nprobe: int = 8, ivf_min_points: int = 20000):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_points = ivf_min_points
+        self._collections: Dict[str, _Collection] = {}
+
+    async def ensure_collection(self, collection: str, dimensions: int, indexed_fields: Sequence[str] = ()):
+        if collection not in self._collections:
+            self._collections[collection] = _Collection(dimensions)
+
+    async def upsert(self, collection: str, points: List[VectorPoint]):
+        store = self._collections[collection]
+        for point in points:
+            store.append(self._normalize(point.vector), point)
+        if self.nlist and store.centroids is None and len(store.alive) >= self.ivf_min_points:
+            store.train(self.nlist)
+
+    async def search(
+            self,
+            collection: str,
+            vector: List[float],
+            limit: int,
+            filters: Optional[VectorFilter] = None,
+            min_score: Optional[float] = None,
+    ) -> List[VectorHit]:
+        store = self._collections.get(collection)
+        if store is None:
+            return []
+        query = self._normalize(vector)
+        rows = np.fromiter(store.candidates(query, filters, self.nprobe), dtype=np.int64)
+        if not len(rows):
+            return []
+        scores = store.vectors[rows] @ query
+        top = np.argsort(-scores)[:limit]
+        hits = []
+        for i in top.tolist():
+            score = float(scores[i])
+            if min_score is not None and score < min_score:
+                break
+            row = int(rows[i])
+            hits.append(VectorHit(id=store.ids[row], score=score, payload=store.payloads[row]))
+        return hits
+
+    async def delete(self, collection: str, filters: VectorFilter):
+        store = self._collections.get(collection)
+        if store is None:
+            return
+        for row in list(store.candidates(np.zeros(store.dimensions, dtype=np.float32), filters, len(store.lists))):
+            store.remove(row)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
@@ -0,0 +1,145 @@
+import abc
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+from pydantic import BaseModel, Field
+
+from app.config.main import settings
+from app.utils.serialization import serializer
+
+
+class VectorPoint(BaseModel):
+    id: uuid.UUID
+    vector: List[float]
+    payload: Dict[str, Any] = Field(default_factory=dict)
+
+
+class VectorHit(BaseModel):
+    id: uuid.UUID
+    score: float
+    payload: Dict[str, Any] = Field(default_factory=dict)
+
+
+class VectorFilter(BaseModel):
+    match: Dict[str, Any] = Field(default_factory=dict)
+    any: Dict[str, List[Any]] = Field(default_factory=dict)
+    lt: Dict[str, float] = Field(default_factory=dict)
+
+
+class VectorStore(abc.ABC):
+    @abc.abstractmethod
+    async def ensure_collection(self, collection: str, dimensions: int, indexed_fields: Sequence[str] = ()):
+        ...
+
+    @abc.abstractmethod
+    async def upsert(self, collection: str, points: List[VectorPoint]):
+        ...
+
+    @abc.abstractmethod
+    async def search(
+            self,
+            collection: str,
+            vector: List[float],
+            limit: int,
+            filters: Optional[VectorFilter] = None,
+            min_score: Optional[float] = None,
+    ) -> List[VectorHit]:
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, collection: str, filters: VectorFilter):
+        ...
+
+    async def close(self):
+        pass
+
+
+class QdrantVectorStore(VectorStore):
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    async def ensure_collection(self, collection: str, dimensions: int, indexed_fields: Sequence[str] = ()):
+        response = await self.client.get(f"/collections/{collection}")
+        if response.status_code == 200:
+            return
+        response = await self.client.put(
+            f"/collections/{collection}",
+            json={"vectors": {"size": dimensions, "distance": "Cosine"}},
+        )
+        response.raise_for_status()
+        for field_name in indexed_fields:
+            response = await self.client.put(
+                f"/collections/{collection}/index",
+                json={"field_name": field_name, "field_schema": "keyword"},
+            )
+            response.raise_for_status()
+
+    async def upsert(self, collection: str, points: List[VectorPoint]):
+        if not points:
+            return
+        response = await self.client.put(
+            f"/collections/{collection}/points",
+            content=serializer.dumps({"points": [point.model_dump() for point in points]}),
+        )
+        response.raise_for_status()
+
+    async def search(
+            self,
+            collection: str,
+            vector: List[float],
+            limit: int,
+            filters: Optional[VectorFilter] = None,
+            min_score: Optional[float] = None,
+    ) -> List[VectorHit]:
+        body: Dict[str, Any] = {"vector": vector, "limit": limit, "with_payload": True}
+        if filters:
+            body["filter"] = self._build_filter(filters)
+        if min_score is not None:
+            body["score_threshold"] = min_score
+        response = await self.client.post(f"/collections/{collection}/points/search", content=serializer.dumps(body))
+        response.raise_for_status()
+        return [VectorHit.model_validate(hit) for hit in serializer.loads(response.content)["result"]]
+
+    async def delete(self, collection: str, filters: VectorFilter):
+        response = await self.client.post(
+            f"/collections/{collection}/points/delete",
+            json={"filter": self._build_filter(filters)},
+        )
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+    @staticmethod
+    def _build_filter(filters: VectorFilter) -> Dict[str, Any]:
+        must = [{"key": key, "match": {"value": value}} for key, value in filters.match.items()]
+        must += [{"key": key, "match": {"any": values}} for key, values in filters.any.items()]
+        must += [{"key": key, "range": {"lt": value}} for key, value in filters.lt.items()]
+        return {"must": must}
+
+
+def create_vector_store(backend: str) -> VectorStore:
+    match backend:
+        case "qdrant":
+            return QdrantVectorStore(httpx.AsyncClient(
+                base_url=settings.database.QDRANT_URL,
+                headers={"Content-Type": "application/json"},
+                timeout=10.0,
+            ))
+        case "memory":
+            # numpy нужен только локальному бэкенду, поэтому импортируем его лениво
+            from app.database.vector_memory import InMemoryVectorStore
+            return InMemoryVectorStore()
+        case _:
+            raise ValueError(f"Unsupported vector backend: {backend}")
+
+
+_vector_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = create_vector_store(settings.database.VECTOR_BACKEND)
+    return _vector_store
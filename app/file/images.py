@@ -0,0 +1,249 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from app.chat.context import VARIANT_KEY_FIELD
+from app.common.cache import LRUCache
+from app.config.main import settings
+from app.database.s3_client import get_s3_client, get_s3_presign_client
+from app.file.imaging import FORMAT_CONTENT_TYPES, make_variant
+
+logger = logging.getLogger(__name__)
+
+# эти поля meta выставляет только сервер, присланные клиентом значения отбрасываем
+VARIANT_META_FIELDS = (VARIANT_KEY_FIELD, "variant_url", "sha256", "width", "height")
+
+# по адресу объекта в хранилище говорит, может ли текущий пользователь его читать
+CanRead = Callable[[str], Awaitable[bool]]
+
+
+class ImageOptimizer:
+    def __init__(
+            self,
+            bucket: str,
+            storage_url: str,
+            public_url: str,
+            url_ttl: int = 15 * 60,
+            max_side: int = 2048,
+            max_short_side: int = 768,
+            low_max_side: int = 512,
+            image_format: str = "webp",
+            quality: int = 80,
+            max_bytes: int = 20 * 1024 * 1024,
+            workers: int = 2,
+            cache_size: int = 10000,
+            cache_ttl: float = 60 * 60,
+    ):
+        if image_format not in FORMAT_CONTENT_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.bucket = bucket
+        self.storage_url = storage_url
+        self.public_url = public_url
+        self.url_ttl = url_ttl
+        # профили повторяют то, до чего модель всё равно уменьшит картинку: больше отправлять бессмысленно
+        self.profiles = {
+            "high": (max_side, max_short_side),
+            "low": (low_max_side, 0),
+        }
+        self.image_format = image_format
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._cache: LRUCache[Dict[str, Any]] = LRUCache(cache_size, cache_ttl)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._pool is not None
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def close(self):
+        if not self.is_running:
+            return
+        pool, self._pool = self._pool, None
+        await asyncio.to_thread(pool.shutdown)
+
+    async def prepare(self, content: Any, can_read: CanRead) -> Any:
+        if not isinstance(content, list):
+            return content
+        positions = [i for i, item in enumerate(content) if item.get("type") == "image_url"]
+        if not positions:
+            return content
+        # права проверяем по очереди до gather: can_read ходит в БД через общую сессию
+        allowed = [await self._can_load(content[i], can_read) for i in positions]
+        prepared = await asyncio.gather(*(
+            self._prepare_item(content[i], is_allowed) for i, is_allowed in zip(positions, allowed)
+        ))
+        content = list(content)
+        for i, item in zip(positions, prepared):
+            content[i] = item
+        return content
+
+    async def sign(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # variants/ приватен: модель получает короткоживущую подписанную ссылку, в истории остаётся только ключ
+        presign_client = get_s3_presign_client()
+        signed = []
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list) and any(VARIANT_KEY_FIELD in item for item in content):
+                items = []
+                for item in content:
+                    if VARIANT_KEY_FIELD in item:
+                        item = dict(item)
+                        url = await presign_client.generate_presigned_url(
+                            "get_object",
+                            Params={"Bucket": self.bucket, "Key": item.pop(VARIANT_KEY_FIELD)},
+                            ExpiresIn=self.url_ttl,
+                        )
+                        item["image_url"] = {**item["image_url"], "url": url}
+                    items.append(item)
+                message = {**message, "content": items}
+            signed.append(message)
+        return signed
+
+    async def _can_load(self, item: Dict[str, Any], can_read: CanRead) -> bool:
+        url = (item.get("image_url") or {}).get("url")
+        if not url or not self.is_running:
+            return False
+        if url.startswith("data:"):
+            return True
+        key = self._source_key(url)
+        # объект из нашего бакета читаем, только если у пользователя есть ссылка на этот файл
+        return key is not None and await can_read(f"{self.storage_url}/{self.bucket}/{key}")
+
+    async def _prepare_item(self, item: Dict[str, Any], allowed: bool) -> Dict[str, Any]:
+        meta = {key: value for key, value in (item.get("meta") or {}).items() if key not in VARIANT_META_FIELDS}
+        item = {**item, "meta": meta or None}
+        image_url = item.get("image_url") or {}
+        url = image_url.get("url")
+        if not allowed:
+            return item
+        profile = "low" if image_url.get("detail") == "low" else "high"
+        try:
+            variant = await self._get_variant(url, profile)
+        except Exception:
+            # без оптимизации картинка всё равно уйдёт модели как есть
+            logger.exception("Failed to optimize image %s", url[:100])
+            return item
+        if variant is None:
+            return item
+        return {**item, "meta": {**meta, **variant}}
+
+    async def _get_variant(self, url: str, profile: str) -> Optional[Dict[str, Any]]:
+        # data URL может весить мегабайты, в ключ кэша кладём только его хэш
+        cache_key = (hashlib.sha256(url.encode()).digest() if url.startswith("data:") else url, profile)
+        variant = self._cache.get(cache_key)
+        if variant is not None:
+            return variant
+        data = await self._load(url)
+        if data is None:
+            return None
+        sha256 = hashlib.sha256(data).hexdigest()
+        # ключ по хэшу содержимого: один и тот же снимок в разных чатах обрабатывается один раз
+        key = f"variants/{sha256[:2]}/{sha256}/{profile}.{self.image_format}"
+        s3_client = get_s3_client()
+        try:
+            head = await s3_client.head_object(Bucket=self.bucket, Key=key)
+            width, height = int(head["Metadata"]["width"]), int(head["Metadata"]["height"])
+        except (ClientError, KeyError, ValueError):
+            body, width, height = await self._make_variant(data, profile)
+            del data
+            await s3_client.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=body,
+                ContentType=FORMAT_CONTENT_TYPES[self.image_format],
+                CacheControl="private, max-age=31536000, immutable",
+                Metadata={"width": str(width), "height": str(height), "source-sha256": sha256},
+            )
+        variant = {
+            VARIANT_KEY_FIELD: key,
+            "sha256": sha256,
+            "width": width,
+            "height": height,
+        }
+        self._cache.set(cache_key, variant)
+        return variant
+
+    async def _make_variant(self, data: bytes, profile: str) -> Tuple[bytes, int, int]:
+        max_side, max_short_side = self.profiles[profile]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool,
+            make_variant,
+            data,
+            max_side,
+            max_short_side,
+            self.image_format,
+            self.quality,
+        )
+
+    async def _load(self, url: str) -> Optional[bytes]:
+        if url.startswith("data:"):
+            header, _, payload = url.partition(",")
+            if not header.endswith(";base64") or len(payload) * 3 // 4 > self.max_bytes:
+                return None
+            try:
+                return base64.b64decode(payload, validate=True)
+            except binascii.Error:
+                return None
+        key = self._source_key(url)
+        if key is None:
+            return None
+        response = await get_s3_client().get_object(Bucket=self.bucket, Key=key)
+        async with response["Body"] as body:
+            if response["ContentLength"] > self.max_bytes:
+                return None
+            return await body.read()
+
+    def _source_key(self, url: str) -> Optional[str]:
+        # сторонние ссылки не скачиваем: сервер не должен ходить по произвольным адресам пользователя
+        for prefix in {f"{self.storage_url}/{self.bucket}/", f"{self.public_url}/{self.bucket}/"}:
+            if url.startswith(prefix):
+                key = url.removeprefix(prefix).split("?", 1)[0]
+                return None if key.startswith("variants/") else key
+        return None
+
+
+def create_image_optimizer() -> Optional[ImageOptimizer]:
+    if not settings.chat.IMAGE_OPTIMIZATION_ENABLED:
+        return None
+    if importlib.util.find_spec("PIL") is None:
+        logger.warning("Pillow is not installed, images are sent to the model as is")
+        return None
+    if not settings.database.MINIO_PUBLIC_URL:
+        logger.warning("MINIO_PUBLIC_URL is not set, images are sent to the model as is")
+        return None
+    return ImageOptimizer(
+        bucket=settings.database.MINIO_BUCKET_NAME,
+        storage_url=settings.database.MINIO_URL,
+        public_url=settings.database.MINIO_PUBLIC_URL,
+        url_ttl=settings.database.MINIO_DOWNLOAD_URL_TTL,
+        max_side=settings.chat.IMAGE_MAX_SIDE,
+        max_short_side=settings.chat.IMAGE_MAX_SHORT_SIDE,
+        low_max_side=settings.chat.IMAGE_LOW_MAX_SIDE,
+        image_format=settings.chat.IMAGE_FORMAT,
+        quality=settings.chat.IMAGE_QUALITY,
+        max_bytes=settings.chat.IMAGE_MAX_BYTES,
+        workers=settings.chat.IMAGE_WORKERS,
+        cache_size=settings.chat.IMAGE_CACHE_SIZE,
+    )
+
+
+image_optimizer = create_image_optimizer()
+
+
+def get_image_optimizer() -> ImageOptimizer | None:
+    return image_optimizer
@@ -0,0 +1,45 @@
+import io
+from typing import Tuple
+
+# как и parsing.py, модуль выполняется в процессах пула: только чистые функции без settings
+
+FORMAT_CONTENT_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+
+def target_size(width: int, height: int, max_side: int, max_short_side: int = 0) -> Tuple[int, int]:
+    scale = min(1.0, max_side / max(width, height))
+    if max_short_side:
+        scale = min(scale, max_short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def make_variant(
+        data: bytes,
+        max_side: int,
+        max_short_side: int = 0,
+        image_format: str = "webp",
+        quality: int = 80,
+) -> Tuple[bytes, int, int]:
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        size = target_size(*image.size, max_side, max_short_side)
+        # для JPEG декодер сразу уменьшает картинку в 2-8 раз: 12 Мп фото не разворачиваем целиком
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        # draft уменьшает с запасом и до поворота по EXIF, поэтому размер считаем заново
+        size = target_size(*image.size, max_side, max_short_side)
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if image_format == "jpeg" or not has_alpha:
+            image = image.convert("RGB")
+        elif image.mode != "RGBA":
+            image = image.convert("RGBA")
+        output = io.BytesIO()
+        image.save(output, format=image_format.upper(), quality=quality, optimize=True)
+        return output.getvalue(), image.width, image.height
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.chat.utils import message_text
+from app.config.main import settings
+from app.database.s3_client import get_s3_client
+from app.database.vector_store import VectorFilter, VectorPoint, VectorStore, get_vector_store
+from app.file.parsing import is_supported, parse_document
+from app.file.schemas import FileSchema
+from app.managers.embeddings import EmbeddingClient, get_embedding_client
+from app.utils.openai import MESSAGE_OVERHEAD_TOKENS, count_text_tokens
+
+logger = logging.getLogger(__name__)
+
+EXCERPTS_HEADER = "Relevant excerpts from the attached files:\n"
+# сообщение из одного файла без вопроса: ищем по общему запросу, чтобы отдать самое содержательное
+DEFAULT_FILE_QUERY = "Main points of the document"
+
+
+class DocumentIngestor:
+    def __init__(
+            self,
+            store: VectorStore,
+            embedder: EmbeddingClient,
+            collection: str,
+            dimensions: int,
+            chunk_tokens: int = 400,
+            overlap_tokens: int = 50,
+            max_bytes: int = 20 * 1024 * 1024,
+            workers: int = 2,
+            queue_size: int = 1000,
+            top_k: int = 6,
+            min_score: Optional[float] = None,
+            max_tokens: int = 1536,
+    ):
+        self.store = store
+        self.embedder = embedder
+        self.collection = collection
+        self.dimensions = dimensions
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.queue_size = queue_size
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_tokens = max_tokens
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._dropped = 0
+
+    @property
+    def is_running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self):
+        if self.is_running:
+            return
+        await self.store.ensure_collection(self.collection, self.dimensions, indexed_fields=["file_id"])
+        # spawn вместо fork: форк процесса с работающим event loop и открытыми сокетами небезопасен
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def close(self):
+        if not self.is_running:
+            return
+        for _ in self._tasks:
+            await self._queue.put(None)
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        await asyncio.to_thread(self._pool.shutdown)
+        self._pool = None
+
+    def submit(self, file: FileSchema, key: str):
+        if not self.is_running:
+            return
+        if file.size > self.max_bytes or not is_supported(file.content_type, file.filename):
+            return
+        try:
+            self._queue.put_nowait((file, key))
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning("File ingestion queue is full, dropped %d files so far", self._dropped)
+
+    async def remove(self, file_id: uuid.UUID):
+        if not self.is_running:
+            return
+        try:
+            await self.store.delete(self.collection, VectorFilter(match={"file_id": str(file_id)}))
+        except httpx.HTTPError:
+            logger.exception("Failed to remove chunks of file %s", file_id)
+
+    async def retrieve(self, filenames: Dict[uuid.UUID, str], content: Any) -> Optional[Dict[str, Any]]:
+        if not filenames or not self.is_running:
+            return None
+        # имя в payload дал первый загрузивший, в промпт идёт имя, под которым файл хранит этот пользователь
+        names = {str(file_id): filename for file_id, filename in filenames.items()}
+        try:
+            vector = await self.embedder.embed_one(message_text(content) or DEFAULT_FILE_QUERY)
+            hits = await self.store.search(
+                self.collection,
+                vector,
+                limit=self.top_k,
+                filters=VectorFilter(any={"file_id": list(names)}),
+                min_score=self.min_score,
+            )
+        except (httpx.HTTPError, KeyError):
+            logger.exception("Failed to retrieve chunks of files %s", list(names))
+            return None
+        lines = []
+        tokens = MESSAGE_OVERHEAD_TOKENS + count_text_tokens(EXCERPTS_HEADER)
+        # самые релевантные фрагменты берём первыми, а в промпт кладём в порядке документа
+        for hit in hits:
+            filename = names.get(hit.payload["file_id"], hit.payload["filename"])
+            line = f"[{filename}, part {hit.payload['index'] + 1}]\n{hit.payload['text']}"
+            line_tokens = count_text_tokens(line)
+            if tokens + line_tokens > self.max_tokens:
+                continue
+            lines.append((hit.payload["file_id"], hit.payload["index"], line))
+            tokens += line_tokens
+        if not lines:
+            return None
+        return {
+            "role": "system",
+            "content": EXCERPTS_HEADER + "\n\n".join(line for *_, line in sorted(lines)),
+            "tokens": tokens,
+        }
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+            file, key = item
+            try:
+                await self._ingest(file, key)
+            except Exception:
+                # один битый файл не должен останавливать воркер
+                logger.exception("Failed to ingest file %s", file.id)
+
+    async def _ingest(self, file: FileSchema, key: str):
+        response = await get_s3_client().get_object(Bucket=settings.database.MINIO_BUCKET_NAME, Key=key)
+        async with response["Body"] as body:
+            data = await body.read()
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(
+            self._pool,
+            parse_document,
+            data,
+            file.content_type,
+            file.filename,
+            self.chunk_tokens,
+            self.overlap_tokens,
+        )
+        del data
+        # эмбеддим и пишем пачками, чтобы большой документ не держал в памяти все векторы сразу
+        for start in range(0, len(chunks), self.embedder.batch_size):
+            batch = chunks[start:start + self.embedder.batch_size]
+            vectors = await self.embedder.embed(batch)
+            await self.store.upsert(self.collection, [
+                VectorPoint(
+                    # детерминированный id: повторная индексация перезаписывает, а не дублирует
+                    id=uuid.uuid5(file.id, str(start + i)),
+                    vector=vector,
+                    payload={
+                        "file_id": str(file.id),
+                        "filename": file.filename,
+                        "index": start + i,
+                        "text": text,
+                    },
+                )
+                for i, (text, vector) in enumerate(zip(batch, vectors))
+            ])
+        logger.info("Indexed file %s: %d chunks", file.id, len(chunks))
+
+
+document_ingestor = DocumentIngestor(
+    get_vector_store(),
+    get_embedding_client(),
+    collection=settings.chat.FILE_COLLECTION,
+    dimensions=settings.chat.EMBEDDING_DIMENSIONS,
+    chunk_tokens=settings.chat.FILE_CHUNK_TOKENS,
+    overlap_tokens=settings.chat.FILE_CHUNK_OVERLAP_TOKENS,
+    max_bytes=settings.chat.FILE_MAX_BYTES,
+    workers=settings.chat.FILE_INGEST_WORKERS,
+    queue_size=settings.chat.FILE_INGEST_QUEUE_SIZE,
+    top_k=settings.chat.FILE_RETRIEVAL_TOP_K,
+    min_score=settings.chat.FILE_RETRIEVAL_MIN_SCORE,
+    max_tokens=settings.chat.FILE_RETRIEVAL_MAX_TOKENS,
+)
+
+
+def get_document_ingestor() -> DocumentIngestor | None:
+    if not settings.chat.FILE_INGESTION_ENABLED:
+        return None
+    return document_ingestor
@@ -1,4 +1,6 @@
-from sqlalchemy import String
+import uuid
+
+from sqlalchemy import UUID, ForeignKey, String, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.common.models import BaseModelMixin, CreatedAtMixin
@@ -12,3 +14,18 @@ class File(Base, BaseModelMixin, CreatedAtMixin):
     content_type: Mapped[str] = mapped_column(String(256))
     size: Mapped[int]
     url: Mapped[str] = mapped_column(String(512))
+    sha256: Mapped[str | None] = mapped_column(String(64), nullable=True, unique=True, index=True)
+    ref_count: Mapped[int] = mapped_column(default=1, server_default=text("1"))
+
+
+# ссылка пользователя на файл: один пользователь держит не больше одной, и отпустить может только свою
+class FileReference(Base, BaseModelMixin, CreatedAtMixin):
+    __tablename__ = "file_reference"
+    __table_args__ = (
+        UniqueConstraint("file_id", "user_id", name="uq_file_reference_file_id_user_id"),
+    )
+
+    file_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("file.id", ondelete="CASCADE"))
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("auth_user.id"))
+    # имя у каждого своё: общий File хранит содержимое, а не то, как его назвал конкретный пользователь
+    filename: Mapped[str] = mapped_column(String(256))
@@ -0,0 +1,147 @@
+import html.parser
+import importlib.util
+import io
+import os
+import re
+from typing import List
+
+from app.utils.openai import BYTES_PER_TOKEN, count_text_tokens
+
+# модуль импортируется в процессах пула, поэтому здесь только stdlib и чистые функции без settings
+
+TEXT_CONTENT_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/x-yaml",
+    "application/yaml",
+}
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".csv", ".tsv", ".json", ".xml", ".yaml", ".yml", ".log", ".rst"}
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+PDF_CONTENT_TYPE = "application/pdf"
+
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+class _HTMLTextExtractor(html.parser.HTMLParser):
+    SKIP_TAGS = {"script", "style", "noscript"}
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def _base_type(content_type: str) -> str:
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def is_supported(content_type: str, filename: str) -> bool:
+    base_type = _base_type(content_type)
+    if base_type == PDF_CONTENT_TYPE:
+        # pdf — опциональная зависимость, без pypdf такие файлы просто не индексируем
+        return importlib.util.find_spec("pypdf") is not None
+    if base_type.startswith("text/") or base_type in TEXT_CONTENT_TYPES:
+        return True
+    return os.path.splitext(filename)[1].lower() in TEXT_EXTENSIONS
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1251", errors="replace")
+
+
+def extract_text(data: bytes, content_type: str, filename: str) -> str:
+    base_type = _base_type(content_type)
+    if base_type == PDF_CONTENT_TYPE:
+        import pypdf
+
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+    text = _decode(data)
+    if base_type in HTML_CONTENT_TYPES:
+        extractor = _HTMLTextExtractor()
+        extractor.feed(text)
+        extractor.close()
+        text = "".join(extractor.parts)
+    return text.replace("\r\n", "\n")
+
+
+def _pieces(text: str, max_tokens: int) -> List[str]:
+    # режем по абзацам, слишком длинные — по предложениям, а затем по словам
+    pieces = []
+    for paragraph in PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_text_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_RE.split(paragraph):
+            if count_text_tokens(sentence) <= max_tokens:
+                pieces.append(sentence)
+                continue
+            words: List[str] = []
+            words_bytes = 0
+            for word in sentence.split():
+                word_bytes = len(word.encode("utf-8")) + 1
+                if words and words_bytes + word_bytes > max_tokens * BYTES_PER_TOKEN:
+                    pieces.append(" ".join(words))
+                    words, words_bytes = [], 0
+                words.append(word)
+                words_bytes += word_bytes
+            if words:
+                pieces.append(" ".join(words))
+    return pieces
+
+
+def split_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in _pieces(text, chunk_tokens):
+        piece_tokens = count_text_tokens(piece)
+        if current and current_tokens + piece_tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            # хвост предыдущего фрагмента повторяем, чтобы мысль на границе не терялась
+            overlap: List[str] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                size = count_text_tokens(previous)
+                if overlap_size + size > overlap_tokens or overlap_size + size + piece_tokens > chunk_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += size
+            current, current_tokens = overlap, overlap_size
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def parse_document(
+        data: bytes,
+        content_type: str,
+        filename: str,
+        chunk_tokens: int,
+        overlap_tokens: int = 0,
+) -> List[str]:
+    return split_text(extract_text(data, content_type, filename), chunk_tokens, overlap_tokens)
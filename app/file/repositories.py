@@ -1,18 +1,78 @@
-from typing import Annotated
+import uuid
+from typing import Annotated, Any, Dict, Optional, Sequence, Tuple
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.common.repositories import BaseRepository
 from app.database.pg_client import get_db
-from app.file.models import File
-from app.file.schemas import FileSchema
+from app.file.models import File, FileReference
+from app.file.schemas import FileReferenceSchema, FileSchema
+
+HeldFile = Tuple[FileSchema, FileReferenceSchema]
+
+
+class FileReferenceRepository(BaseRepository[FileReference, FileReferenceSchema]):
+    model = FileReference
+    schema = FileReferenceSchema
 
 
 class FileRepository(BaseRepository[File, FileSchema]):
     model = File
     schema = FileSchema
 
+    def __init__(self, session: AsyncSession):
+        super().__init__(session)
+        self.references = FileReferenceRepository(session)
+
+    async def acquire_by_hash(self, sha256: str, user_id: uuid.UUID, filename: str) -> Optional[HeldFile]:
+        # счётчик увеличиваем первым: UPDATE блокирует строку и не даёт release удалить её до нашей ссылки
+        files = await self.update_where({"ref_count": File.ref_count + 1}, sha256=sha256)
+        return await self._hold(files[0], user_id, filename) if files else None
+
+    async def add_or_acquire(self, user_id: uuid.UUID, **data: Any) -> HeldFile:
+        # параллельная загрузка того же содержимого могла успеть вставить строку первой
+        files = await self.upsert(data, conflict=["sha256"], set_={"ref_count": File.ref_count + 1})
+        return await self._hold(files[0], user_id, data["filename"])
+
+    async def get_held(self, file_id: uuid.UUID, user_id: uuid.UUID) -> HeldFile:
+        # get_one бросает ValueError: файл без ссылки пользователя для него не существует
+        reference = await self.references.get_one(file_id=file_id, user_id=user_id)
+        return await self.get_one(id=file_id), reference
+
+    async def held_filenames(self, file_ids: Sequence[uuid.UUID], user_id: uuid.UUID) -> Dict[uuid.UUID, str]:
+        if not file_ids:
+            return {}
+        references = await self.references.get_list(file_id__in=list(file_ids), user_id=user_id)
+        return {reference.file_id: reference.filename for reference in references}
+
+    async def holds_url(self, url: str, user_id: uuid.UUID) -> bool:
+        files = await self.get_list(url=url)
+        return bool(files) and await self.references.get_total_count(file_id=files[0].id, user_id=user_id) > 0
+
+    async def release(self, file_id: uuid.UUID, user_id: uuid.UUID) -> Optional[FileSchema]:
+        # чужую или уже отпущенную ссылку не трогаем, повторное удаление ничего не меняет
+        if not await self.references.delete_where(file_id=file_id, user_id=user_id):
+            raise ValueError(f"{self.model.__name__} not found with id: {file_id}")
+        files = await self.update_where({"ref_count": File.ref_count - 1}, id=file_id)
+        if not files or files[0].ref_count > 0:
+            return None
+        # условие на ref_count защищает от acquire, успевшего между двумя запросами
+        deleted = await self.delete_where(id=file_id, ref_count__lte=0)
+        return deleted[0] if deleted else None
+
+    async def _hold(self, file: FileSchema, user_id: uuid.UUID, filename: str) -> HeldFile:
+        added = await self.references.upsert(
+            {"file_id": file.id, "user_id": user_id, "filename": filename},
+            conflict=["file_id", "user_id"],
+        )
+        if added:
+            return file, added[0]
+        # пользователь уже держит этот файл: вторая его ссылка счётчик не увеличивает, меняется только имя
+        files = await self.update_where({"ref_count": File.ref_count - 1}, id=file.id)
+        references = await self.references.update_where({"filename": filename}, file_id=file.id, user_id=user_id)
+        return files[0], references[0]
+
 
 def get_file_repository(
         session: Annotated[AsyncSession, Depends(get_db)],
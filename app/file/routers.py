@@ -1,18 +1,116 @@
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+import uuid
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import RedirectResponse
 from starlette import status
 
+from app.auth.schemas import AuthUserSchema
+from app.auth.utils import get_current_user
+from app.config.main import settings
+from app.file.schemas import UploadCompleteSchema, UploadSessionCreateSchema, UploadSessionSchema
 from app.file.services import FileService, get_file_service
+from app.file.uploads import MultipartFileReader
 
 router = APIRouter(prefix="/file", tags=["Files"])
 
 
-@router.post("/upload")
+# тело читаем сами: UploadFile сначала целиком складывает файл во временный файл на диске
+@router.post(
+    "/upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    },
+                },
+            },
+        },
+    },
+)
 async def upload_file(
-    file: UploadFile = File(...),
+    request: Request,
+    user: Annotated[AuthUserSchema, Depends(get_current_user)],
     service: FileService = Depends(get_file_service),
 ):
     try:
-        result = await service.upload_file(file)
+        reader = MultipartFileReader(request)
+        await reader.open()
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        result = await service.upload_file(reader.filename, reader.content_type, reader.chunks(), user.id)
         return {"message": "Файл успешно загружен", "file": result}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.delete("/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_file(
+    file_id: uuid.UUID,
+    user: Annotated[AuthUserSchema, Depends(get_current_user)],
+    service: FileService = Depends(get_file_service),
+):
+    try:
+        await service.delete_file(file_id, user.id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+
+# байты идут напрямую в хранилище, API только выдаёт подписанные ссылки и фиксирует результат
+@router.post("/uploads", response_model=UploadSessionSchema)
+async def create_upload_session(
+    data: UploadSessionCreateSchema,
+    user: Annotated[AuthUserSchema, Depends(get_current_user)],
+    service: FileService = Depends(get_file_service),
+):
+    return await service.create_upload_session(data, user.id)
+
+
+@router.post("/uploads/{session_id}/complete")
+async def complete_upload_session(
+    session_id: uuid.UUID,
+    data: UploadCompleteSchema,
+    user: Annotated[AuthUserSchema, Depends(get_current_user)],
+    service: FileService = Depends(get_file_service),
+):
+    try:
+        result = await service.complete_upload_session(session_id, data, user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"message": "Файл успешно загружен", "file": result}
+
+
+@router.delete("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(
+    session_id: uuid.UUID,
+    user: Annotated[AuthUserSchema, Depends(get_current_user)],
+    service: FileService = Depends(get_file_service),
+):
+    try:
+        await service.abort_upload_session(session_id, user.id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+
+
+@router.get("/{file_id}/download")
+async def download_file(
+    file_id: uuid.UUID,
+    user: Annotated[AuthUserSchema, Depends(get_current_user)],
+    service: FileService = Depends(get_file_service),
+):
+    try:
+        url = await service.get_download_url(file_id, user.id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    # редирект кэшируется вдвое короче ссылки, чтобы клиент не получил из кэша уже истёкшую
+    return RedirectResponse(
+        url,
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": f"private, max-age={settings.database.MINIO_DOWNLOAD_URL_TTL // 2}"},
+    )
@@ -1,5 +1,9 @@
 import datetime
+import enum
 import uuid
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
 
 from app.common.schemas import OrmModel
 
@@ -10,4 +14,68 @@ class FileSchema(OrmModel):
     content_type: str
     size: int
     url: str
+    sha256: Optional[str] = None
+    ref_count: int = 1
     created_at: datetime.datetime
+
+
+class FileReferenceSchema(OrmModel):
+    file_id: uuid.UUID
+    user_id: uuid.UUID
+    filename: str
+    created_at: datetime.datetime
+
+
+# то, что видит пользователь: без хэша, счётчика и внутреннего адреса, имя — его собственное
+class UserFileSchema(BaseModel):
+    id: uuid.UUID
+    filename: str
+    content_type: str
+    size: int
+    created_at: datetime.datetime
+
+    @classmethod
+    def from_reference(cls, file: FileSchema, reference: FileReferenceSchema) -> "UserFileSchema":
+        return cls(
+            id=file.id,
+            filename=reference.filename,
+            content_type=file.content_type,
+            size=file.size,
+            created_at=reference.created_at,
+        )
+
+
+class UploadMethodEnum(str, enum.Enum):
+    put = "put"
+    multipart = "multipart"
+
+
+class UploadSessionCreateSchema(BaseModel):
+    filename: str = Field(min_length=1, max_length=200)
+    content_type: str = Field("application/octet-stream", max_length=256)
+    size: int = Field(gt=0)
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-f]{64}$")
+
+
+class UploadPartUrlSchema(BaseModel):
+    part_number: int
+    url: str
+
+
+class UploadSessionSchema(BaseModel):
+    session_id: uuid.UUID
+    method: UploadMethodEnum
+    expires_in: int
+    url: Optional[str] = None
+    headers: Dict[str, str] = Field(default_factory=dict)
+    part_size: Optional[int] = None
+    parts: List[UploadPartUrlSchema] = Field(default_factory=list)
+
+
+class UploadedPartSchema(BaseModel):
+    part_number: int = Field(ge=1, le=10000)
+    etag: str
+
+
+class UploadCompleteSchema(BaseModel):
+    parts: List[UploadedPartSchema] = Field(default_factory=list)
@@ -1,14 +1,29 @@
+import base64
+import math
+import urllib.parse
 import uuid
-from typing import Annotated
+from typing import Annotated, Any, AsyncIterator, Dict, Optional
 
 import httpx
 from botocore.client import BaseClient
-from fastapi import Depends, UploadFile
+from botocore.exceptions import ClientError
+from fastapi import Depends
 
 from app.config.main import settings
-from app.database.s3_client import get_s3_client
-from app.file.repositories import FileRepository, get_file_repository
-from app.file.schemas import FileSchema
+from app.database.redis_client import RedisUploadSessionStore, get_upload_session_store
+from app.database.s3_client import get_s3_client, get_s3_presign_client
+from app.file.ingestion import DocumentIngestor, get_document_ingestor
+from app.file.repositories import FileRepository, HeldFile, get_file_repository
+from app.file.schemas import (
+    FileSchema,
+    UploadCompleteSchema,
+    UploadMethodEnum,
+    UploadPartUrlSchema,
+    UploadSessionCreateSchema,
+    UploadSessionSchema,
+    UserFileSchema,
+)
+from app.file.uploads import MAX_PARTS, MIN_PART_SIZE, S3MultipartUploader
 from app.managers.client import get_http_client
 
 
@@ -18,38 +33,224 @@ class FileService:
             file_repo: FileRepository,
             s3_repo: BaseClient,
             client: httpx.AsyncClient,
+            presign_repo: BaseClient,
+            upload_sessions: RedisUploadSessionStore,
+            ingestor: DocumentIngestor | None = None,
     ):
         self.file_repo = file_repo
         self.s3_repo = s3_repo
         self.client = client
+        self.presign_repo = presign_repo
+        self.upload_sessions = upload_sessions
+        self.ingestor = ingestor
 
     async def upload_file(
             self,
-            file: UploadFile,
-    ) -> FileSchema:
+            filename: str,
+            content_type: str,
+            chunks: AsyncIterator[bytes],
+            user_id: uuid.UUID,
+    ) -> UserFileSchema:
         file_id = uuid.uuid4()
-        s3_key = f"uploads/{str(file_id)}_{file.filename}"
-        async with self.s3_repo as s3_client:
-            await s3_client.upload_fileobj(
-                Fileobj=file.file,
-                Bucket=settings.database.MINIO_BUCKET_NAME,
-                Key=s3_key,
-                ExtraArgs={"ContentType": file.content_type},
-            )
-        url = f"{settings.database.MINIO_URL}/{settings.database.MINIO_BUCKET_NAME}/{s3_key}"
-        file_data = await self.file_repo.add(
+        s3_key = f"uploads/{str(file_id)}_{filename}"
+        uploader = S3MultipartUploader(
+            self.s3_repo,
+            bucket=settings.database.MINIO_BUCKET_NAME,
+            key=s3_key,
+            content_type=content_type,
+            part_size=settings.database.MINIO_PART_SIZE,
+            max_concurrency=settings.database.MINIO_UPLOAD_CONCURRENCY,
+        )
+        existing: Optional[HeldFile] = None
+
+        async def is_duplicate(sha256: str) -> bool:
+            nonlocal existing
+            existing = await self.file_repo.acquire_by_hash(sha256, user_id, filename)
+            return existing is not None
+
+        result = await uploader.upload(chunks, is_duplicate)
+        if not result.stored:
+            return UserFileSchema.from_reference(*existing)
+        file_data, reference = await self.file_repo.add_or_acquire(
+            user_id,
             id=file_id,
-            filename=file.filename,
-            size=file.size,
-            content_type=file.content_type,
-            url=url,
+            filename=filename,
+            size=result.size,
+            content_type=content_type,
+            url=self._get_url(s3_key),
+            sha256=result.sha256,
+        )
+        if file_data.id != file_id:
+            # такой же файл параллельно загрузили раньше нас — наша копия лишняя
+            await self.s3_repo.delete_object(Bucket=settings.database.MINIO_BUCKET_NAME, Key=s3_key)
+        else:
+            self._ingest(file_data)
+        return UserFileSchema.from_reference(file_data, reference)
+
+    async def delete_file(self, file_id: uuid.UUID, user_id: uuid.UUID):
+        deleted = await self.file_repo.release(file_id, user_id)
+        if deleted is None:
+            return
+        # объект удаляем только после коммита: откат не должен оставить строку без объекта
+        await self.file_repo.session.commit()
+        await self.s3_repo.delete_object(Bucket=settings.database.MINIO_BUCKET_NAME, Key=self._get_key(deleted.url))
+        if self.ingestor is not None:
+            await self.ingestor.remove(deleted.id)
+
+    async def create_upload_session(self, data: UploadSessionCreateSchema, user_id: uuid.UUID) -> UploadSessionSchema:
+        bucket = settings.database.MINIO_BUCKET_NAME
+        ttl = settings.database.MINIO_UPLOAD_SESSION_TTL
+        file_id = uuid.uuid4()
+        s3_key = f"uploads/{str(file_id)}_{data.filename}"
+        session = {
+            "file_id": str(file_id),
+            "key": s3_key,
+            "filename": data.filename,
+            "content_type": data.content_type,
+            "size": data.size,
+            "sha256": None,
+            "upload_id": None,
+            "user_id": str(user_id),
+        }
+        # S3 отклоняет части меньше 5 МиБ (кроме последней), поэтому настройку ограничиваем снизу
+        part_size = max(MIN_PART_SIZE, settings.database.MINIO_PART_SIZE, math.ceil(data.size / MAX_PARTS))
+        if data.size <= part_size:
+            params = {"Bucket": bucket, "Key": s3_key, "ContentType": data.content_type}
+            headers = {"Content-Type": data.content_type}
+            if data.sha256:
+                # хранилище само сверит тело с заявленным хэшем, иначе PUT отклонится
+                checksum = base64.b64encode(bytes.fromhex(data.sha256)).decode()
+                params["ChecksumSHA256"] = checksum
+                headers["x-amz-checksum-sha256"] = checksum
+                session["sha256"] = data.sha256
+            url = await self.presign_repo.generate_presigned_url("put_object", Params=params, ExpiresIn=ttl)
+            session_id = await self.upload_sessions.create(session)
+            return UploadSessionSchema(
+                session_id=session_id,
+                method=UploadMethodEnum.put,
+                expires_in=ttl,
+                url=url,
+                headers=headers,
+            )
+        upload = await self.s3_repo.create_multipart_upload(Bucket=bucket, Key=s3_key, ContentType=data.content_type)
+        session["upload_id"] = upload["UploadId"]
+        parts = []
+        for part_number in range(1, math.ceil(data.size / part_size) + 1):
+            url = await self.presign_repo.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": bucket, "Key": s3_key, "UploadId": upload["UploadId"], "PartNumber": part_number},
+                ExpiresIn=ttl,
+            )
+            parts.append(UploadPartUrlSchema(part_number=part_number, url=url))
+        session_id = await self.upload_sessions.create(session)
+        return UploadSessionSchema(
+            session_id=session_id,
+            method=UploadMethodEnum.multipart,
+            expires_in=ttl,
+            part_size=part_size,
+            parts=parts,
         )
-        return file_data
+
+    async def complete_upload_session(
+            self,
+            session_id: uuid.UUID,
+            data: UploadCompleteSchema,
+            user_id: uuid.UUID,
+    ) -> UserFileSchema:
+        bucket = settings.database.MINIO_BUCKET_NAME
+        session = await self._get_upload_session(session_id, user_id)
+        s3_key = session["key"]
+        try:
+            if session["upload_id"]:
+                await self.s3_repo.complete_multipart_upload(
+                    Bucket=bucket,
+                    Key=s3_key,
+                    UploadId=session["upload_id"],
+                    MultipartUpload={"Parts": [
+                        {"PartNumber": part.part_number, "ETag": part.etag}
+                        for part in sorted(data.parts, key=lambda part: part.part_number)
+                    ]},
+                )
+            head = await self.s3_repo.head_object(Bucket=bucket, Key=s3_key, ChecksumMode="ENABLED")
+        except ClientError as e:
+            raise ValueError(f"Upload is not complete: {e}") from e
+        if head["ContentLength"] != session["size"]:
+            await self.s3_repo.delete_object(Bucket=bucket, Key=s3_key)
+            await self.upload_sessions.delete(session_id)
+            raise ValueError("Uploaded size does not match the declared size")
+        sha256 = session["sha256"]
+        # хэшу верим, только если хранилище подтвердило контрольную сумму объекта
+        if sha256 and head.get("ChecksumSHA256") != base64.b64encode(bytes.fromhex(sha256)).decode():
+            sha256 = None
+        file_id = uuid.UUID(session["file_id"])
+        file_data = {
+            "id": file_id,
+            "filename": session["filename"],
+            "size": head["ContentLength"],
+            "content_type": session["content_type"],
+            "url": self._get_url(s3_key),
+        }
+        # без хэша конфликта по sha256 не будет, и файл просто вставится новой строкой
+        file, reference = await self.file_repo.add_or_acquire(user_id, **file_data, sha256=sha256)
+        if file.id != file_id:
+            await self.s3_repo.delete_object(Bucket=bucket, Key=s3_key)
+        else:
+            self._ingest(file)
+        await self.upload_sessions.delete(session_id)
+        return UserFileSchema.from_reference(file, reference)
+
+    async def abort_upload_session(self, session_id: uuid.UUID, user_id: uuid.UUID):
+        bucket = settings.database.MINIO_BUCKET_NAME
+        session = await self._get_upload_session(session_id, user_id)
+        if session["upload_id"]:
+            await self.s3_repo.abort_multipart_upload(Bucket=bucket, Key=session["key"], UploadId=session["upload_id"])
+        else:
+            await self.s3_repo.delete_object(Bucket=bucket, Key=session["key"])
+        await self.upload_sessions.delete(session_id)
+
+    async def get_download_url(self, file_id: uuid.UUID, user_id: uuid.UUID) -> str:
+        file, reference = await self.file_repo.get_held(file_id, user_id)
+        ttl = settings.database.MINIO_DOWNLOAD_URL_TTL
+        return await self.presign_repo.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": settings.database.MINIO_BUCKET_NAME,
+                "Key": self._get_key(file.url),
+                "ResponseContentType": file.content_type,
+                "ResponseContentDisposition": f"attachment; filename*=UTF-8''{urllib.parse.quote(reference.filename)}",
+                # содержимое по ключу неизменно, кэш ограничен лишь сроком жизни ссылки
+                "ResponseCacheControl": f"private, max-age={ttl}, immutable",
+            },
+            ExpiresIn=ttl,
+        )
+
+    async def _get_upload_session(self, session_id: uuid.UUID, user_id: uuid.UUID) -> Dict[str, Any]:
+        session = await self.upload_sessions.get(session_id)
+        # чужую сессию не отличаем от несуществующей, чтобы не раскрывать её наличие
+        if session is None or session.get("user_id") != str(user_id):
+            raise ValueError("Upload session not found")
+        return session
+
+    def _ingest(self, file: FileSchema):
+        # дубликат уже проиндексирован при первой загрузке — разбираем только новое содержимое
+        if self.ingestor is not None:
+            self.ingestor.submit(file, self._get_key(file.url))
+
+    @staticmethod
+    def _get_url(s3_key: str) -> str:
+        return f"{settings.database.MINIO_URL}/{settings.database.MINIO_BUCKET_NAME}/{s3_key}"
+
+    @staticmethod
+    def _get_key(url: str) -> str:
+        return url.removeprefix(f"{settings.database.MINIO_URL}/{settings.database.MINIO_BUCKET_NAME}/")
 
 
 def get_file_service(
         file_repo: Annotated[FileRepository, Depends(get_file_repository)],
         s3_repo: Annotated[BaseClient, Depends(get_s3_client)],
         client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+        presign_repo: Annotated[BaseClient, Depends(get_s3_presign_client)],
+        upload_sessions: Annotated[RedisUploadSessionStore, Depends(get_upload_session_store)],
+        ingestor: Annotated[DocumentIngestor | None, Depends(get_document_ingestor)],
 ) -> FileService:
-    return FileService(file_repo, s3_repo, client)
+    return FileService(file_repo, s3_repo, client, presign_repo, upload_sessions, ingestor)
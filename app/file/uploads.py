@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# S3 не принимает части меньше 5 МиБ, кроме последней
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+@dataclass
+class UploadResult:
+    size: int
+    sha256: str
+    stored: bool = True
+
+
+class MultipartFileReader:
+    def __init__(self, request: Request):
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise ValueError("Expected a multipart/form-data body")
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self._body = request.stream()
+        self._chunks: Deque[bytes] = collections.deque()
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self._file_done = False
+        self._parser = MultipartParser(params[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def open(self):
+        # читаем тело, пока не дойдём до заголовков первого файлового поля
+        while self.filename is None:
+            if not await self._read():
+                raise ValueError("Multipart body has no file field")
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            while self._chunks:
+                yield self._chunks.popleft()
+            if self._file_done:
+                return
+            if not await self._read():
+                raise ValueError("Unexpected end of multipart body")
+
+    async def _read(self) -> bool:
+        chunk = await anext(self._body, None)
+        if chunk is None:
+            return False
+        self._parser.write(chunk)
+        return True
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if self.filename is None and b"filename" in options:
+            self._in_file = True
+            self.filename = options[b"filename"].decode()
+            self.content_type = self._headers.get(b"content-type", b"application/octet-stream").decode()
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._chunks.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._file_done = True
+
+
+class S3MultipartUploader:
+    def __init__(
+            self,
+            s3_client: Any,
+            bucket: str,
+            key: str,
+            content_type: str,
+            part_size: int = 8 * 1024 * 1024,
+            max_concurrency: int = 4,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._upload_id: Optional[str] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def upload(
+            self,
+            chunks: AsyncIterator[bytes],
+            is_duplicate: Optional[Callable[[str], Awaitable[bool]]] = None,
+    ) -> UploadResult:
+        digest = hashlib.sha256()
+        size = 0
+        pending: List[bytes] = []
+        pending_size = 0
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                while chunk:
+                    take = min(len(chunk), self.part_size - pending_size)
+                    pending.append(chunk[:take])
+                    pending_size += take
+                    chunk = chunk[take:]
+                    if pending_size == self.part_size:
+                        await self._submit(b"".join(pending))
+                        pending, pending_size = [], 0
+            sha256 = digest.hexdigest()
+            if self._upload_id is None:
+                # хэш известен до PUT: дубликат маленького файла вообще не уходит в S3
+                if is_duplicate is not None and await is_duplicate(sha256):
+                    return UploadResult(size=size, sha256=sha256, stored=False)
+                # файл меньше одной части — обычного PUT достаточно
+                await self.s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    Body=b"".join(pending),
+                    ContentType=self.content_type,
+                )
+            else:
+                if pending:
+                    await self._submit(b"".join(pending))
+                parts = await asyncio.gather(*self._tasks)
+                if is_duplicate is not None and await is_duplicate(sha256):
+                    # части уже загружены, но объект не собираем — abort освобождает место
+                    await self._abort()
+                    return UploadResult(size=size, sha256=sha256, stored=False)
+                await self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            await self._abort()
+            raise
+        return UploadResult(size=size, sha256=sha256)
+
+    async def _submit(self, body: bytes):
+        # семафор ограничивает память: в полёте не больше max_concurrency частей
+        await self._slots.acquire()
+        for task in self._tasks:
+            if task.done() and task.exception() is not None:
+                self._slots.release()
+                raise task.exception()
+        if self._upload_id is None:
+            try:
+                response = await self.s3_client.create_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    ContentType=self.content_type,
+                )
+            except BaseException:
+                self._slots.release()
+                raise
+            self._upload_id = response["UploadId"]
+        self._tasks.append(asyncio.create_task(self._upload_part(len(self._tasks) + 1, body)))
+
+    async def _upload_part(self, part_number: int, body: bytes) -> Dict[str, Any]:
+        try:
+            response = await self.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+        finally:
+            self._slots.release()
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    async def _abort(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._upload_id is None:
+            return
+        try:
+            await asyncio.shield(self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+            ))
+        except Exception:
+            # исходную ошибку не подменяем, висящие части уберёт lifecycle-политика бакета
+            logger.exception("Failed to abort multipart upload %s", self._upload_id)
+        self._upload_id = None
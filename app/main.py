@@ -4,19 +4,54 @@ import uvicorn
 from fastapi import FastAPI
 
 from app.auth.routers import router as auth_router
+from app.chat.persistence import get_message_writer
+from app.chat.retrieval import get_message_retriever
 from app.chat.routers import router as chats_router
+from app.chat.summarizer import chat_summarizer
+from app.database.s3_client import s3_manager
+from app.database.vector_store import get_vector_store
+from app.file.images import get_image_optimizer
+from app.file.ingestion import get_document_ingestor
 from app.file.routers import router as files_router
-from app.managers.client import get_http_client
+from app.managers.client import get_llm_transport
+from app.managers.connections import get_ws_manager
+from app.utils.serialization import JSONResponse
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    ws_manager = get_ws_manager()
+    await ws_manager.start()
+    await s3_manager.start()
+    message_writer = get_message_writer()
+    if message_writer is not None:
+        await message_writer.start()
+    message_retriever = get_message_retriever()
+    if message_retriever is not None:
+        await message_retriever.start()
+    document_ingestor = get_document_ingestor()
+    if document_ingestor is not None:
+        await document_ingestor.start()
+    image_optimizer = get_image_optimizer()
+    if image_optimizer is not None:
+        await image_optimizer.start()
     yield
-    client = get_http_client()
-    await client.aclose()
+    await ws_manager.close()
+    await chat_summarizer.close()
+    if message_retriever is not None:
+        await message_retriever.close()
+    if document_ingestor is not None:
+        await document_ingestor.close()
+    if image_optimizer is not None:
+        await image_optimizer.close()
+    if message_writer is not None:
+        await message_writer.stop()
+    await get_llm_transport().aclose()
+    await get_vector_store().close()
+    await s3_manager.close()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
 
 app.include_router(chats_router)
 app.include_router(auth_router)
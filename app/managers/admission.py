@@ -0,0 +1,206 @@
+import asyncio
+import collections
+import logging
+import math
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Callable, Deque, Dict, List, Optional, OrderedDict
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.config.main import settings
+from app.database.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+PositionCallback = Callable[[int], None]
+
+# оба ведра проверяются и списываются атомарно: отказ по любому из них не тратит токены другого
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+if wait == 0 then
+    for i, key in ipairs(KEYS) do
+        levels[i] = levels[i] - 1
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', levels[i], 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+
+class AdmissionError(Exception):
+    def __init__(self, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            user_capacity: int,
+            user_refill_rate: float,
+            global_capacity: int = 0,
+            global_refill_rate: float = 0.0,
+    ):
+        self.redis = redis_client
+        self.user_capacity = user_capacity
+        self.user_refill_rate = user_refill_rate
+        self.global_capacity = global_capacity
+        self.global_refill_rate = global_refill_rate
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    @staticmethod
+    def _get_user_key(user_id: uuid.UUID) -> str:
+        return f"ratelimit:generation:user:{user_id}"
+
+    @staticmethod
+    def _get_global_key() -> str:
+        return "ratelimit:generation:global"
+
+    async def acquire(self, user_id: uuid.UUID):
+        keys = [self._get_user_key(user_id)]
+        args: List[float] = [self.user_capacity, self.user_refill_rate]
+        if self.global_capacity and self.global_refill_rate:
+            keys.append(self._get_global_key())
+            args += [self.global_capacity, self.global_refill_rate]
+        try:
+            wait = float(await self._script(keys=keys, args=args))
+        except RedisError:
+            # недоступный Redis не должен останавливать чат целиком
+            logger.exception("Rate limiter is unavailable, admitting generation")
+            return
+        if wait > 0:
+            raise AdmissionError("Rate limit exceeded", retry_after=math.ceil(wait))
+
+
+class AdmissionController:
+    def __init__(
+            self,
+            max_concurrent: int,
+            max_queue: int,
+            limiter: Optional[TokenBucketLimiter] = None,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.limiter = limiter
+        self.active = 0
+        self.rejected = 0
+        # очередь на пользователя + round-robin между ними: всплеск одного не отодвигает остальных
+        self._queues: OrderedDict[uuid.UUID, Deque[asyncio.Future]] = collections.OrderedDict()
+        self._callbacks: Dict[asyncio.Future, PositionCallback] = {}
+
+    @property
+    def queued(self) -> int:
+        return len(self._callbacks)
+
+    @asynccontextmanager
+    async def admit(
+            self,
+            user_id: uuid.UUID,
+            on_position: Optional[PositionCallback] = None,
+    ) -> AsyncGenerator[None, None]:
+        if self.limiter is not None:
+            await self.limiter.acquire(user_id)
+        await self._acquire(user_id, on_position)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, user_id: uuid.UUID, on_position: Optional[PositionCallback]):
+        if self.active < self.max_concurrent and not self._queues:
+            self.active += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionError("Server is overloaded, try again later")
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, collections.deque()).append(waiter)
+        self._callbacks[waiter] = on_position or (lambda position: None)
+        self._notify_positions()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # слот уже выдан, но забрать его некому — передаём следующему
+                self._release()
+            else:
+                self._discard(user_id, waiter)
+                self._notify_positions()
+            raise
+
+    def _release(self):
+        self.active -= 1
+        while self._queues and self.active < self.max_concurrent:
+            user_id, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            del self._callbacks[waiter]
+            if waiters:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self.active += 1
+            waiter.set_result(None)
+        self._notify_positions()
+
+    def _discard(self, user_id: uuid.UUID, waiter: asyncio.Future):
+        self._callbacks.pop(waiter, None)
+        waiters = self._queues.get(user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._queues[user_id]
+
+    def _notify_positions(self):
+        # позиции в порядке фактической выдачи: по одному ожидающему от каждого пользователя за круг
+        queues = list(self._queues.values())
+        position = 0
+        for depth in range(max((len(waiters) for waiters in queues), default=0)):
+            for waiters in queues:
+                if depth < len(waiters):
+                    position += 1
+                    self._callbacks[waiters[depth]](position)
+
+
+admission_controller = AdmissionController(
+    max_concurrent=settings.chat.GENERATION_MAX_CONCURRENT,
+    max_queue=settings.chat.GENERATION_QUEUE_SIZE,
+    limiter=TokenBucketLimiter(
+        get_redis_client(),
+        user_capacity=settings.chat.RATE_LIMIT_USER_BURST,
+        user_refill_rate=settings.chat.RATE_LIMIT_USER_PER_MINUTE / 60,
+        global_capacity=settings.chat.RATE_LIMIT_GLOBAL_BURST,
+        global_refill_rate=settings.chat.RATE_LIMIT_GLOBAL_PER_MINUTE / 60,
+    ) if settings.chat.RATE_LIMIT_ENABLED else None,
+)
+
+
+def get_admission_controller() -> AdmissionController:
+    return admission_controller
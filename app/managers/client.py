@@ -1,16 +1,37 @@
 import httpx
 
 from app.config.main import settings
+from app.managers.transport import CircuitBreaker, LLMTransport
 
-http_client = httpx.AsyncClient(
+llm_transport = LLMTransport(
     base_url=settings.security.OPENAI_URL,
-    timeout=30.0,
-    headers={
-        "Authorization": f"Bearer {settings.security.OPENAI_API_KEY}",
-        "Content-Type": "application/json",
-    },
+    api_key=settings.security.OPENAI_API_KEY,
+    max_connections=settings.llm.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.llm.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.llm.LLM_KEEPALIVE_EXPIRY,
+    http2=settings.llm.LLM_HTTP2,
+    connect_timeout=settings.llm.LLM_CONNECT_TIMEOUT,
+    write_timeout=settings.llm.LLM_WRITE_TIMEOUT,
+    pool_timeout=settings.llm.LLM_POOL_TIMEOUT,
+    first_byte_timeout=settings.llm.LLM_FIRST_BYTE_TIMEOUT,
+    inter_token_timeout=settings.llm.LLM_INTER_TOKEN_TIMEOUT,
+    max_retries=settings.llm.LLM_MAX_RETRIES,
+    retry_backoff=settings.llm.LLM_RETRY_BACKOFF,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.llm.LLM_BREAKER_THRESHOLD,
+        reset_timeout=settings.llm.LLM_BREAKER_COOLDOWN,
+    ),
+    hedge_enabled=settings.llm.LLM_HEDGE_ENABLED,
+    hedge_percentile=settings.llm.LLM_HEDGE_PERCENTILE,
+    hedge_min_samples=settings.llm.LLM_HEDGE_MIN_SAMPLES,
 )
 
+http_client = llm_transport.client
 
-def get_http_client():
+
+def get_http_client() -> httpx.AsyncClient:
     return http_client
+
+
+def get_llm_transport() -> LLMTransport:
+    return llm_transport
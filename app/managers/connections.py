@@ -1,51 +1,322 @@
 import asyncio
-import json
+import collections
+import enum
+import logging
+import time
 import uuid
-from typing import Dict, List
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
 
+import redis.asyncio as redis
+from fastapi import status
 from fastapi.websockets import WebSocket
+from redis.exceptions import RedisError
 from starlette.websockets import WebSocketDisconnect
 
+from app.config.main import settings
+from app.database.redis_client import get_redis_client
+from app.utils.serialization import serializer
+
+logger = logging.getLogger(__name__)
+
+Frame = Union[str, dict]
+
+
+class OverflowPolicyEnum(str, enum.Enum):
+    drop = "drop"
+    merge = "merge"
+    disconnect = "disconnect"
+
+
+class ClientConnection:
+    def __init__(
+            self,
+            user_id: uuid.UUID,
+            websocket: WebSocket,
+            on_close: Callable[["ClientConnection"], Awaitable[None]],
+            max_queue: int = 256,
+            send_timeout: float = 5.0,
+            overflow_policy: OverflowPolicyEnum = OverflowPolicyEnum.merge,
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.key = uuid.uuid4().hex
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        self.closed = False
+        self._on_close = on_close
+        self._frames: Deque[Frame] = collections.deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._run())
+
+    def send(self, frame: Frame) -> bool:
+        if self.closed:
+            return False
+        if len(self._frames) >= self.max_queue:
+            match self.overflow_policy:
+                case OverflowPolicyEnum.drop:
+                    self.dropped += 1
+                    return False
+                case OverflowPolicyEnum.merge:
+                    if self._merge(frame):
+                        return True
+                    # end/error/cancelled и чужие кадры не выкидываем: освобождаем место,
+                    # склеивая соседние токены, а если склеивать нечего — отключаем клиента
+                    if not self._compact():
+                        self._close_later(status.WS_1013_TRY_AGAIN_LATER)
+                        return False
+                case OverflowPolicyEnum.disconnect:
+                    self._close_later(status.WS_1013_TRY_AGAIN_LATER)
+                    return False
+        self._frames.append(frame)
+        self._ready.set()
+        return True
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code != status.WS_1000_NORMAL_CLOSURE:
+            try:
+                await self.websocket.close(code=code)
+            except (WebSocketDisconnect, ConnectionResetError, RuntimeError):
+                pass
+        await self._on_close(self)
+
+    def _close_later(self, code: int):
+        # ссылку держим, иначе задачу может собрать GC до завершения
+        if self._closing is None:
+            self._closing = asyncio.create_task(self.close(code))
+
+    def _merge(self, frame: Frame) -> bool:
+        last = self._frames[-1]
+        if not self._mergeable(last, frame):
+            return False
+        self._frames[-1] = {**last, "content": last["content"] + frame["content"]}
+        return True
+
+    def _compact(self) -> bool:
+        for i in range(len(self._frames) - 1):
+            first, second = self._frames[i], self._frames[i + 1]
+            if self._mergeable(first, second):
+                self._frames[i] = {**first, "content": first["content"] + second["content"]}
+                del self._frames[i + 1]
+                return True
+        return False
+
+    @staticmethod
+    def _mergeable(first: Frame, second: Frame) -> bool:
+        if not isinstance(first, dict) or not isinstance(second, dict):
+            return False
+        if first.get("type") != "token" or second.get("type") != "token":
+            return False
+        return {k: v for k, v in first.items() if k != "content"} == {k: v for k, v in second.items() if k != "content"}
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._frames:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                frame = self._frames.popleft()
+                text = frame if isinstance(frame, str) else serializer.dumps_str(frame)
+                await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+        except asyncio.TimeoutError:
+            # медленный клиент не должен копить очередь бесконечно
+            await self.close(status.WS_1013_TRY_AGAIN_LATER)
+        except (WebSocketDisconnect, ConnectionResetError, RuntimeError):
+            await self.close()
+
 
 class ConnectionManager:
     _instance = None
 
+    SUBSCRIPTION_SHARDS = 64
+
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
+    def __init__(
+            self,
+            redis_client: Optional[redis.Redis] = None,
+            presence_ttl: int = 60,
+            max_queue: int = 256,
+            send_timeout: float = 5.0,
+            overflow_policy: OverflowPolicyEnum = OverflowPolicyEnum.merge,
+    ):
         if not hasattr(self, "active_connections"):
-            self.active_connections: Dict[uuid.UUID, List[WebSocket]] = {}
-            self._lock = asyncio.Lock()
-
-    async def connect(self, connection_id: uuid.UUID, websocket: WebSocket):
-        async with self._lock:
-            if connection_id not in self.active_connections:
-                self.active_connections[connection_id] = []
-            self.active_connections[connection_id].append(websocket)
+            # copy-on-write: кортежи соединений заменяются целиком, читатели не берут блокировок
+            self.active_connections: Dict[uuid.UUID, Tuple[ClientConnection, ...]] = {}
+            self.redis = redis_client
+            self.presence_ttl = presence_ttl
+            self.max_queue = max_queue
+            self.send_timeout = send_timeout
+            self.overflow_policy = overflow_policy
+            self.worker_id = uuid.uuid4().hex
+            self._subscribed: Set[uuid.UUID] = set()
+            self._subscription_locks = [asyncio.Lock() for _ in range(self.SUBSCRIPTION_SHARDS)]
+            self._pubsub: Optional[redis.client.PubSub] = None
+            self._tasks: List[asyncio.Task] = []
+
+    @property
+    def is_distributed(self) -> bool:
+        return self.redis is not None
+
+    @staticmethod
+    def _get_channel(user_id: uuid.UUID) -> str:
+        return f"ws:user:{user_id}"
+
+    @staticmethod
+    def _get_presence_key(user_id: uuid.UUID) -> str:
+        return f"ws:presence:{user_id}"
+
+    async def start(self):
+        if not self.is_distributed or self._pubsub is not None:
+            return
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        # служебный канал воркера: pubsub-соединение должно существовать до первого пользователя
+        await self._pubsub.subscribe(f"ws:worker:{self.worker_id}")
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._refresh_presence()),
+        ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for connections in list(self.active_connections.values()):
+            for connection in connections:
+                await connection.close(status.WS_1001_GOING_AWAY)
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def connect(self, connection_id: uuid.UUID, websocket: WebSocket) -> ClientConnection:
         await websocket.accept()
+        connection = ClientConnection(
+            connection_id,
+            websocket,
+            on_close=self._unregister,
+            max_queue=self.max_queue,
+            send_timeout=self.send_timeout,
+            overflow_policy=self.overflow_policy,
+        )
+        connection.start()
+        self.active_connections[connection_id] = self.active_connections.get(connection_id, ()) + (connection,)
+        if self._pubsub is not None:
+            await self._sync_subscription(connection_id)
+            await self._mark_present(connection)
+        return connection
 
     async def disconnect(self, connection_id: uuid.UUID, websocket: WebSocket):
-        async with self._lock:
-            connections = self.active_connections.get(connection_id)
-            if connections and websocket in connections:
-                connections.remove(websocket)
-                if not connections:
-                    del self.active_connections[connection_id]
+        for connection in self.active_connections.get(connection_id, ()):
+            if connection.websocket is websocket:
+                await connection.close()
 
     async def send_to_user(self, user_id: uuid.UUID, message: dict):
-        text = json.dumps(message, ensure_ascii=False)
-        async with self._lock:
-            for ws in self.active_connections.get(user_id, []):
-                try:
-                    await ws.send_text(text)
-                except (WebSocketDisconnect, ConnectionResetError, RuntimeError, asyncio.CancelledError):
-                    continue
+        # кодируем один раз: готовый кадр уходит и в Redis, и во все соединения пользователя
+        frame = serializer.dumps_str(message)
+        if self.is_distributed:
+            # доставкой занимаются подписчики всех воркеров, включая этот
+            await self.redis.publish(self._get_channel(user_id), frame)
+            return
+        self._deliver(user_id, frame)
+
+    async def online_connections(self, user_id: uuid.UUID) -> int:
+        if not self.is_distributed:
+            return len(self.active_connections.get(user_id, ()))
+        presence = await self.redis.hgetall(self._get_presence_key(user_id))
+        threshold = time.time() - self.presence_ttl
+        return sum(1 for seen_at in presence.values() if float(seen_at) >= threshold)
+
+    async def is_online(self, user_id: uuid.UUID) -> bool:
+        return await self.online_connections(user_id) > 0
+
+    def _deliver(self, user_id: uuid.UUID, frame: Frame):
+        for connection in self.active_connections.get(user_id, ()):
+            connection.send(frame)
+
+    async def _unregister(self, connection: ClientConnection):
+        connections = tuple(c for c in self.active_connections.get(connection.user_id, ()) if c is not connection)
+        if connections:
+            self.active_connections[connection.user_id] = connections
+        else:
+            self.active_connections.pop(connection.user_id, None)
+        if self._pubsub is not None:
+            await self._sync_subscription(connection.user_id)
+            await self._mark_absent(connection)
+
+    async def _sync_subscription(self, user_id: uuid.UUID):
+        lock = self._subscription_locks[hash(user_id) % self.SUBSCRIPTION_SHARDS]
+        async with lock:
+            wanted = user_id in self.active_connections
+            if wanted and user_id not in self._subscribed:
+                await self._pubsub.subscribe(self._get_channel(user_id))
+                self._subscribed.add(user_id)
+            elif not wanted and user_id in self._subscribed:
+                await self._pubsub.unsubscribe(self._get_channel(user_id))
+                self._subscribed.discard(user_id)
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except RedisError:
+                logger.exception("WebSocket fan-out subscriber failed, reconnecting")
+                await asyncio.sleep(1)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            prefix, _, user_id = message["channel"].rpartition(":")
+            if prefix != "ws:user":
+                continue
+            self._deliver(uuid.UUID(user_id), message["data"])
+
+    async def _mark_present(self, connection: ClientConnection):
+        key = self._get_presence_key(connection.user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, f"{self.worker_id}:{connection.key}", time.time())
+            pipe.expire(key, self.presence_ttl)
+            await pipe.execute()
+
+    async def _mark_absent(self, connection: ClientConnection):
+        await self.redis.hdel(self._get_presence_key(connection.user_id), f"{self.worker_id}:{connection.key}")
+
+    async def _refresh_presence(self):
+        while True:
+            await asyncio.sleep(self.presence_ttl / 2)
+            now = time.time()
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for user_id, connections in list(self.active_connections.items()):
+                        key = self._get_presence_key(user_id)
+                        for connection in connections:
+                            pipe.hset(key, f"{self.worker_id}:{connection.key}", now)
+                        pipe.expire(key, self.presence_ttl)
+                    await pipe.execute()
+            except RedisError:
+                logger.exception("Failed to refresh WebSocket presence")
 
 
-ws_manager = ConnectionManager()
+ws_manager = ConnectionManager(
+    redis_client=get_redis_client() if settings.chat.WS_DISTRIBUTED else None,
+    presence_ttl=settings.chat.WS_PRESENCE_TTL,
+    max_queue=settings.chat.WS_SEND_QUEUE_SIZE,
+    send_timeout=settings.chat.WS_SEND_TIMEOUT,
+    overflow_policy=OverflowPolicyEnum(settings.chat.WS_OVERFLOW_POLICY),
+)
 
 
 def get_ws_manager() -> ConnectionManager:
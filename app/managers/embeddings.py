@@ -0,0 +1,52 @@
+from typing import List, Optional
+
+import httpx
+
+from app.config.main import settings
+from app.managers.client import get_http_client
+from app.utils.serialization import serializer
+
+
+class EmbeddingClient:
+    def __init__(
+            self,
+            client: httpx.AsyncClient,
+            model: str,
+            dimensions: Optional[int] = None,
+            batch_size: int = 64,
+    ):
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            payload = {
+                "model": self.model,
+                "input": texts[start:start + self.batch_size],
+            }
+            if self.dimensions:
+                payload["dimensions"] = self.dimensions
+            response = await self.client.post("embeddings", json=payload)
+            response.raise_for_status()
+            data = sorted(serializer.loads(response.content)["data"], key=lambda item: item["index"])
+            vectors.extend(item["embedding"] for item in data)
+        return vectors
+
+    async def embed_one(self, text: str) -> List[float]:
+        vectors = await self.embed([text])
+        return vectors[0]
+
+
+embedding_client = EmbeddingClient(
+    get_http_client(),
+    model=settings.chat.EMBEDDING_MODEL,
+    dimensions=settings.chat.EMBEDDING_DIMENSIONS,
+    batch_size=settings.chat.EMBEDDING_BATCH_SIZE,
+)
+
+
+def get_embedding_client() -> EmbeddingClient:
+    return embedding_client
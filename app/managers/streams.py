@@ -0,0 +1,104 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+SendFunc = Callable[[dict], Awaitable[None]]
+
+
+class CoalescingStreamWriter:
+    SENTENCE_ENDINGS = (".", "!", "?", ";", ":", "\n", "。", "！", "？")
+
+    def __init__(
+            self,
+            send: SendFunc,
+            flush_interval: float = 0.05,
+            flush_bytes: int = 256,
+            flush_on_sentence: bool = True,
+    ):
+        self._send = send
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.flush_on_sentence = flush_on_sentence
+        self._parts: List[str] = []
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._first_sent = False
+        self._timer: Optional[asyncio.Task] = None
+        self._timer_waiting = False
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "CoalescingStreamWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.flush()
+        else:
+            self._cancel_timer()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    async def write(self, token: str):
+        if not token:
+            return
+        self._parts.append(token)
+        self._pending.append(token)
+        self._pending_bytes += len(token.encode())
+        # первый токен отправляем сразу, чтобы не ухудшать time-to-first-token
+        if not self._first_sent or self._should_flush(token):
+            await self.flush()
+            return
+        if self._timer is not None and self._timer.done():
+            await self._drain_timer()
+        if self._timer is None:
+            self._timer_waiting = True
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        await self._drain_timer()
+        await self._flush_pending()
+
+    async def _flush_pending(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            content = "".join(self._pending)
+            self._pending.clear()
+            self._pending_bytes = 0
+            self._first_sent = True
+            await self._send({"type": "token", "content": content})
+
+    def _should_flush(self, token: str) -> bool:
+        if self.flush_interval <= 0 or self._pending_bytes >= self.flush_bytes:
+            return True
+        return self.flush_on_sentence and token.rstrip(" ").endswith(self.SENTENCE_ENDINGS)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer_waiting = False
+        await self._flush_pending()
+
+    async def _drain_timer(self):
+        timer, self._timer = self._timer, None
+        if timer is None:
+            return
+        # пока таймер спит, его можно просто отменить; уже начатую отправку дожидаемся,
+        # иначе отмена оборвёт send посреди кадра
+        if self._timer_waiting:
+            timer.cancel()
+        # wait, в отличие от await, не переносит отмену вызывающего внутрь таймера
+        await asyncio.wait((timer,))
+        if not timer.cancelled():
+            # ошибка отложенной отправки всплывает у того, кто пишет в поток
+            timer.result()
+
+    def _cancel_timer(self):
+        timer, self._timer = self._timer, None
+        if timer is None:
+            return
+        if timer.done() and not timer.cancelled():
+            # поток уже завершается с ошибкой, исключение таймера только помечаем полученным
+            timer.exception()
+        else:
+            timer.cancel()
@@ -0,0 +1,220 @@
+import asyncio
+import collections
+import importlib.util
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+import httpx
+
+from app.utils.serialization import serializer
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+OpenedStream = Tuple[httpx.Response, AsyncIterator[bytes], bytes]
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        match self.state:
+            case "open":
+                raise CircuitOpenError("LLM upstream circuit is open")
+            case "half-open":
+                # пропускаем один пробный запрос, остальные ждут его результата
+                if self._trial_in_flight:
+                    raise CircuitOpenError("LLM upstream circuit is half-open")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class LLMTransport:
+    def __init__(
+            self,
+            base_url: str,
+            api_key: str,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            keepalive_expiry: float = 30.0,
+            http2: bool = False,
+            connect_timeout: float = 5.0,
+            write_timeout: float = 10.0,
+            pool_timeout: float = 5.0,
+            first_byte_timeout: float = 30.0,
+            inter_token_timeout: float = 30.0,
+            max_retries: int = 2,
+            retry_backoff: float = 0.2,
+            breaker: Optional[CircuitBreaker] = None,
+            hedge_enabled: bool = False,
+            hedge_percentile: float = 0.95,
+            hedge_min_samples: int = 20,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested for the LLM transport but h2 is not installed, using HTTP/1.1")
+            http2 = False
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(
+                connect=connect_timeout,
+                read=inter_token_timeout,
+                write=write_timeout,
+                pool=pool_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+        self.first_byte_timeout = first_byte_timeout
+        self.inter_token_timeout = inter_token_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedged_requests = 0
+        self._ttft_samples: Deque[float] = collections.deque(maxlen=500)
+
+    async def stream(self, method: str, url: str, json: Dict[str, Any]) -> AsyncIterator[bytes]:
+        response, chunks, first_chunk = await self._open_with_retries(method, url, json)
+        # после первого байта ответ уже уходит клиенту, поэтому ошибки дальше не ретраим
+        try:
+            if first_chunk:
+                yield first_chunk
+            while True:
+                # read-таймаут httpx зависит от транспорта, поэтому паузу между чанками ограничиваем сами
+                async with asyncio.timeout(self.inter_token_timeout):
+                    chunk = await anext(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _open_with_retries(self, method: str, url: str, json: Dict[str, Any]) -> OpenedStream:
+        for attempt in range(self.max_retries + 1):
+            self.breaker.allow()
+            try:
+                opened = await self._open_hedged(method, url, json)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                error = e
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUSES:
+                    # 4xx — ошибка запроса, а не апстрима: брейкер не трогаем
+                    self.breaker.record_success()
+                    raise
+                error = e
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return opened
+            self.breaker.record_failure()
+            if attempt == self.max_retries:
+                raise error
+            # full jitter, чтобы воркеры не ретраили синхронно
+            await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+        raise RuntimeError("unreachable")
+
+    async def _open_hedged(self, method: str, url: str, json: Dict[str, Any]) -> OpenedStream:
+        hedge_delay = self._hedge_delay()
+        primary = asyncio.create_task(self._open(method, url, json))
+        if hedge_delay is None:
+            return await primary
+        tasks: Set[asyncio.Task] = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.hedged_requests += 1
+                tasks.add(asyncio.create_task(self._open(method, url, json)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None:
+                    error = next(iter(done)).exception()
+                    continue
+                for task in done:
+                    if task is not winner and task.exception() is None:
+                        await task.result()[0].aclose()
+                return winner.result()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # дожидаемся отмены проигравших, а успевший открыться ответ закрываем, чтобы не держать соединение
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, tuple):
+                    await result[0].aclose()
+
+    async def _open(self, method: str, url: str, json: Dict[str, Any]) -> OpenedStream:
+        started = time.monotonic()
+        response = await asyncio.wait_for(
+            self.client.send(self.client.build_request(method, url, content=serializer.dumps(json)), stream=True),
+            self.first_byte_timeout,
+        )
+        try:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            chunks = response.aiter_bytes()
+            remaining = max(0.0, self.first_byte_timeout - (time.monotonic() - started))
+            first_chunk = await asyncio.wait_for(anext(chunks, b""), remaining)
+        except BaseException:
+            await response.aclose()
+            raise
+        self._ttft_samples.append(time.monotonic() - started)
+        return response, chunks, first_chunk
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled or len(self._ttft_samples) < self.hedge_min_samples:
+            return None
+        samples = sorted(self._ttft_samples)
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile))]
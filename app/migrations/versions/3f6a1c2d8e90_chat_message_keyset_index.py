@@ -0,0 +1,39 @@
+"""chat_message keyset index
+
+Revision ID: 3f6a1c2d8e90
+Revises: 9bc3579704f2
+Create Date: 2026-10-18 12:05:41.203118
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a1c2d8e90'
+down_revision: Union[str, Sequence[str], None] = '9bc3579704f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_message_chat_id_created_at_id',
+            'chat_message',
+            ['chat_id', 'created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_chat_message_chat_id_created_at_id',
+            table_name='chat_message',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,27 @@
+"""file sha256
+
+Revision ID: 5e8c3a7b9d14
+Revises: d2b7f91c4e53
+Create Date: 2026-10-18 15:41:09.286514
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8c3a7b9d14'
+down_revision: Union[str, Sequence[str], None] = 'd2b7f91c4e53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file', sa.Column('sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('file', 'sha256')
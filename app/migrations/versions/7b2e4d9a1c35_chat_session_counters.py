@@ -0,0 +1,60 @@
+"""chat_session counters
+
+Revision ID: 7b2e4d9a1c35
+Revises: 3f6a1c2d8e90
+Create Date: 2026-10-18 13:42:10.512904
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d9a1c35'
+down_revision: Union[str, Sequence[str], None] = '3f6a1c2d8e90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_session', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_session', sa.Column('last_message_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('chat_session', sa.Column('last_message_preview', sa.String(length=255), nullable=True))
+    op.execute("""
+        UPDATE chat_session AS s
+        SET message_count = m.message_count,
+            last_message_at = m.last_message_at,
+            last_message_preview = m.last_message_preview
+        FROM (
+            SELECT DISTINCT ON (chat_id)
+                chat_id,
+                count(*) OVER (PARTITION BY chat_id) AS message_count,
+                created_at AS last_message_at,
+                left(
+                    CASE WHEN json_typeof(content) = 'array'
+                        THEN content -> 0 ->> 'text'
+                        ELSE content ->> 'text'
+                    END,
+                    255
+                ) AS last_message_preview
+            FROM chat_message
+            ORDER BY chat_id, created_at DESC
+        ) AS m
+        WHERE s.id = m.chat_id
+    """)
+    op.create_index(
+        'ix_chat_session_user_id_updated_at_id',
+        'chat_session',
+        ['user_id', 'updated_at', 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_session_user_id_updated_at_id', table_name='chat_session')
+    op.drop_column('chat_session', 'last_message_preview')
+    op.drop_column('chat_session', 'last_message_at')
+    op.drop_column('chat_session', 'message_count')
@@ -0,0 +1,43 @@
+"""file dedup
+
+Revision ID: a83f0e6c2b71
+Revises: 5e8c3a7b9d14
+Create Date: 2026-10-18 16:12:54.907431
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83f0e6c2b71'
+down_revision: Union[str, Sequence[str], None] = '5e8c3a7b9d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file', sa.Column('ref_count', sa.Integer(), server_default=sa.text('1'), nullable=False))
+    # дубликаты, загруженные до появления индекса, остаются отдельными строками без хэша
+    op.execute(
+        """
+        UPDATE file SET sha256 = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY sha256 ORDER BY created_at, id) AS rn
+                FROM file
+                WHERE sha256 IS NOT NULL
+            ) ranked
+            WHERE rn > 1
+        )
+        """
+    )
+    op.create_index(op.f('ix_file_sha256'), 'file', ['sha256'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_file_sha256'), table_name='file')
+    op.drop_column('file', 'ref_count')
@@ -0,0 +1,39 @@
+"""auth_user email lowercase
+
+Revision ID: b6d24e8f1a93
+Revises: e5a91c7f3d20
+Create Date: 2026-10-18 21:48:12.604719
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d24e8f1a93'
+down_revision: Union[str, Sequence[str], None] = 'e5a91c7f3d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # вход теперь приводит email к нижнему регистру; строки, отличающиеся только регистром,
+    # не трогаем, чтобы не нарушить уникальный индекс — их придётся объединить вручную
+    op.execute(
+        """
+        UPDATE auth_user AS u SET email = lower(u.email)
+        WHERE u.email <> lower(u.email)
+          AND NOT EXISTS (
+              SELECT 1 FROM auth_user AS other
+              WHERE lower(other.email) = lower(u.email) AND other.id <> u.id
+          )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # исходный регистр не сохранялся, откатывать нечего
+    pass
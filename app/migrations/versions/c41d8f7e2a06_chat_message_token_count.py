@@ -0,0 +1,27 @@
+"""chat_message token_count
+
+Revision ID: c41d8f7e2a06
+Revises: 7b2e4d9a1c35
+Create Date: 2026-10-18 14:20:33.118270
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d8f7e2a06'
+down_revision: Union[str, Sequence[str], None] = '7b2e4d9a1c35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_message', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_message', 'token_count')
@@ -0,0 +1,36 @@
+"""drop auth_verify_code
+
+Revision ID: d2b7f91c4e53
+Revises: c41d8f7e2a06
+Create Date: 2026-10-18 15:02:47.530118
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7f91c4e53'
+down_revision: Union[str, Sequence[str], None] = 'c41d8f7e2a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index(op.f('ix_auth_verify_code_code'), table_name='auth_verify_code')
+    op.drop_table('auth_verify_code')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table('auth_verify_code',
+    sa.Column('code', sa.String(length=6), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('expired_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['auth_user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_auth_verify_code_code'), 'auth_verify_code', ['code'], unique=False)
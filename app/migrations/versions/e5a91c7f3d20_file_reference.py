@@ -0,0 +1,39 @@
+"""file reference
+
+Revision ID: e5a91c7f3d20
+Revises: a83f0e6c2b71
+Create Date: 2026-10-18 21:05:37.218406
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a91c7f3d20'
+down_revision: Union[str, Sequence[str], None] = 'a83f0e6c2b71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # владельцы уже загруженных файлов неизвестны: такие файлы остаются, пока их не удалят вручную
+    op.create_table(
+        'file_reference',
+        sa.Column('file_id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('filename', sa.String(length=256), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['file.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['auth_user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('file_id', 'user_id', name='uq_file_reference_file_id_user_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('file_reference')
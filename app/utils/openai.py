@@ -0,0 +1,51 @@
+import math
+from typing import Any, Dict
+
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 765
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIZE = 512
+IMAGE_MAX_SIDE = 2048
+IMAGE_SHORT_SIDE = 768
+FILE_TOKENS = 85
+BYTES_PER_TOKEN = 4
+
+
+def count_text_tokens(text: str) -> int:
+    # оценка без токенизатора: ~4 байта UTF-8 на токен, что близко к cl100k
+    # и для латиницы, и для кириллицы
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def count_image_tokens(width: int, height: int, detail: str | None = None) -> int:
+    if detail == "low":
+        return IMAGE_BASE_TOKENS
+    # так же считает сама модель: вписываем в 2048x2048, короткую сторону уменьшаем до 768,
+    # дальше платим за каждую плитку 512x512
+    scale = min(1.0, IMAGE_MAX_SIDE / max(width, height))
+    scale = min(scale, IMAGE_SHORT_SIDE / min(width, height))
+    tiles = math.ceil(width * scale / IMAGE_TILE_SIZE) * math.ceil(height * scale / IMAGE_TILE_SIZE)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def count_message_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content")
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    if isinstance(content, str):
+        return tokens + count_text_tokens(content)
+    items = content if isinstance(content, list) else [content or {}]
+    for item in items:
+        match item.get("type"):
+            case "text":
+                tokens += count_text_tokens(item.get("text") or "")
+            case "image_url":
+                meta = item.get("meta") or {}
+                if meta.get("width") and meta.get("height"):
+                    detail = (item.get("image_url") or {}).get("detail")
+                    tokens += count_image_tokens(meta["width"], meta["height"], detail)
+                else:
+                    tokens += IMAGE_TOKENS
+            case _:
+                tokens += FILE_TOKENS
+    return tokens
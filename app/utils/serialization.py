@@ -0,0 +1,76 @@
+import abc
+import importlib.util
+import json
+import logging
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse as BaseJSONResponse
+
+from app.config.main import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Serializer(abc.ABC):
+    @abc.abstractmethod
+    def dumps(self, value: Any, sort_keys: bool = False) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        ...
+
+    def dumps_str(self, value: Any, sort_keys: bool = False) -> str:
+        return self.dumps(value, sort_keys).decode()
+
+
+class StdlibSerializer(Serializer):
+    def dumps(self, value: Any, sort_keys: bool = False) -> bytes:
+        return self.dumps_str(value, sort_keys).encode()
+
+    def dumps_str(self, value: Any, sort_keys: bool = False) -> str:
+        return json.dumps(value, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"), default=str)
+
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+class OrjsonSerializer(Serializer):
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, value: Any, sort_keys: bool = False) -> bytes:
+        options = (self._options | self._orjson.OPT_SORT_KEYS) if sort_keys else self._options
+        return self._orjson.dumps(value, default=str, option=options)
+
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        return self._orjson.loads(data)
+
+
+def create_serializer(backend: str) -> Serializer:
+    match backend:
+        case "orjson":
+            if importlib.util.find_spec("orjson") is None:
+                logger.warning("orjson is not installed, falling back to the stdlib json serializer")
+                return StdlibSerializer()
+            return OrjsonSerializer()
+        case "json":
+            return StdlibSerializer()
+    raise ValueError(f"Unknown JSON backend: {backend}")
+
+
+serializer = create_serializer(settings.chat.JSON_BACKEND)
+
+
+def get_serializer() -> Serializer:
+    return serializer
+
+
+class JSONResponse(BaseJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return serializer.dumps(content)
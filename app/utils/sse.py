@@ -0,0 +1,70 @@
+from typing import List, Tuple
+
+import jiter
+
+DONE = b"[DONE]"
+
+
+# границы событий ищутся в общем буфере без построчных копий,
+# копируется только payload события — jiter принимает лишь bytes
+class ChatCompletionStreamParser:
+    def __init__(self):
+        self.done = False
+        self._buffer = bytearray()
+        self._scan = 0
+        self._spans: List[Tuple[int, int]] = []
+
+    def feed(self, chunk: bytes) -> List[str]:
+        buffer = self._buffer
+        buffer += chunk
+        if self.done or b"\n" not in chunk:
+            return []
+        deltas: List[str] = []
+        start = self._scan
+        event_start = 0
+        while not self.done:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            line_end = end - 1 if end > start and buffer[end - 1] == 13 else end
+            if line_end == start:
+                # пустая строка завершает событие
+                if self._spans:
+                    self._dispatch(deltas)
+                event_start = end + 1
+            elif buffer.startswith(b"data:", start, line_end):
+                data_start = start + 5
+                if data_start < line_end and buffer[data_start] == 32:
+                    data_start += 1
+                self._spans.append((data_start, line_end))
+            start = end + 1
+        if self.done:
+            buffer.clear()
+            self._spans.clear()
+            self._scan = 0
+            return deltas
+        # незавершённое событие остаётся в буфере вместе с уже найденными data-строками
+        if event_start:
+            del buffer[:event_start]
+            self._spans = [(s - event_start, e - event_start) for s, e in self._spans]
+        self._scan = start - event_start
+        return deltas
+
+    def _dispatch(self, deltas: List[str]):
+        spans = self._spans
+        with memoryview(self._buffer) as view:
+            if len(spans) == 1:
+                payload = view[spans[0][0]:spans[0][1]].tobytes()
+            else:
+                payload = b"\n".join(view[s:e].tobytes() for s, e in spans)
+        spans.clear()
+        if payload == DONE:
+            self.done = True
+            return
+        try:
+            content = jiter.from_json(payload, cache_mode="keys")["choices"][0]["delta"].get("content")
+        except (ValueError, LookupError, TypeError, AttributeError):
+            # служебные и битые события пропускаем, как и раньше
+            return
+        if content:
+            deltas.append(content)
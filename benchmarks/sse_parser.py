@@ -0,0 +1,107 @@
+"""Сравнение парсеров SSE на синтетическом потоке chat/completions.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.sse_parser --tokens 20000 --chunk-size 4096
+"""
+import argparse
+import codecs
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+# при запуске файлом (python benchmarks/sse_parser.py) в sys.path лежит benchmarks/, а не корень
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.sse import ChatCompletionStreamParser  # noqa: E402
+
+
+def make_stream(tokens: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    words = ["привет", "hello", " world", ",", " это", " ответ", " модели", ".", "\n", " 😀"]
+    events = []
+    for i in range(tokens):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "gpt-4",
+            "choices": [{"index": 0, "delta": {"content": rng.choice(words)}, "finish_reason": None}],
+        }
+        events.append(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+    events.append(b"data: [DONE]\n\n")
+    return b"".join(events)
+
+
+def split_chunks(data: bytes, chunk_size: int) -> List[bytes]:
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def iter_lines(chunks: List[bytes]) -> Iterator[str]:
+    # то же, что делает httpx.Response.aiter_lines
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        yield from lines
+
+
+def parse_lines(chunks: List[bytes]) -> List[str]:
+    # прежняя реализация _stream_chat_completion
+    deltas = []
+    for line in iter_lines(chunks):
+        if line.startswith("data: "):
+            data = line[len("data: "):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                chunk = json.loads(data)
+                delta = chunk["choices"][0]["delta"]
+                if "content" in delta:
+                    deltas.append(delta["content"])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return deltas
+
+
+def parse_bytes(chunks: List[bytes]) -> List[str]:
+    parser = ChatCompletionStreamParser()
+    deltas = []
+    for chunk in chunks:
+        deltas.extend(parser.feed(chunk))
+        if parser.done:
+            break
+    return deltas
+
+
+def measure(func, chunks: List[bytes], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(chunks)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SSE parsers on a synthetic chat/completions stream")
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = split_chunks(make_stream(args.tokens), args.chunk_size)
+    assert parse_lines(chunks) == parse_bytes(chunks)
+    baseline = measure(parse_lines, chunks, args.repeat)
+    candidate = measure(parse_bytes, chunks, args.repeat)
+    for name, elapsed in (("lines+json", baseline), ("bytes+jiter", candidate)):
+        print(f"{name:>12}: {elapsed * 1000:8.2f} ms  {elapsed / args.tokens * 1e6:6.2f} us/token")
+    print(f"{'speedup':>12}: {baseline / candidate:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+
+# settings читаются при импорте app, поэтому обязательные переменные задаём до сбора тестов
+os.environ.setdefault("SECRET", "test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("OPENAI_URL", "http://llm.test/")
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.managers.streams import CoalescingStreamWriter
+
+
+class FailingSend:
+    def __init__(self, fail_after: int):
+        self.frames = []
+        self.fail_after = fail_after
+
+    async def __call__(self, frame: dict):
+        if len(self.frames) >= self.fail_after:
+            raise ConnectionError("socket closed")
+        self.frames.append(frame)
+
+
+def test_tokens_are_coalesced_between_flushes():
+    async def run():
+        send = FailingSend(fail_after=10)
+        async with CoalescingStreamWriter(send, flush_interval=10, flush_on_sentence=False) as writer:
+            for token in ("a", "b", "c"):
+                await writer.write(token)
+        return send.frames, writer.text
+
+    frames, text = asyncio.run(run())
+    assert [frame["content"] for frame in frames] == ["a", "bc"]
+    assert text == "abc"
+
+
+def test_timer_flush_error_propagates_to_flush():
+    async def run():
+        writer = CoalescingStreamWriter(FailingSend(fail_after=1), flush_interval=0.01, flush_on_sentence=False)
+        await writer.write("a")
+        await writer.write("b")
+        await asyncio.sleep(0.05)
+        await writer.flush()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+
+def test_timer_flush_error_propagates_to_next_write():
+    async def run():
+        writer = CoalescingStreamWriter(FailingSend(fail_after=1), flush_interval=0.01, flush_on_sentence=False)
+        await writer.write("a")
+        await writer.write("b")
+        await asyncio.sleep(0.05)
+        await writer.write("c")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+
+def test_flush_waits_for_timer_send_in_progress():
+    async def run():
+        frames = []
+
+        async def slow_send(frame: dict):
+            await asyncio.sleep(0.05)
+            frames.append(frame["content"])
+
+        writer = CoalescingStreamWriter(slow_send, flush_interval=0.01, flush_on_sentence=False)
+        await writer.write("a")
+        await writer.write("b")
+        await asyncio.sleep(0.02)
+        await writer.write("c")
+        await writer.flush()
+        return frames
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.managers.transport import CircuitBreaker, CircuitOpenError, LLMTransport
+
+
+def make_transport(handler, **kwargs) -> LLMTransport:
+    kwargs.setdefault("retry_backoff", 0)
+    return LLMTransport("http://llm.test", "key", transport=httpx.MockTransport(handler), **kwargs)
+
+
+async def collect(transport: LLMTransport) -> bytes:
+    try:
+        return b"".join([chunk async for chunk in transport.stream("POST", "/chat/completions", {})])
+    finally:
+        await transport.aclose()
+
+
+def test_retries_before_first_byte():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, content=b"data: ok\n\n")
+
+    assert asyncio.run(collect(make_transport(handler))) == b"data: ok\n\n"
+    assert len(calls) == 2
+
+
+def test_no_retry_after_first_byte():
+    calls = []
+
+    async def body():
+        yield b"data: first\n\n"
+        raise httpx.ReadError("connection reset")
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=body())
+
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(collect(make_transport(handler)))
+    assert len(calls) == 1
+
+
+def test_inter_token_timeout():
+    async def body():
+        yield b"data: first\n\n"
+        await asyncio.sleep(1)
+        yield b"data: late\n\n"
+
+    def handler(request):
+        return httpx.Response(200, content=body())
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(collect(make_transport(handler, inter_token_timeout=0.05)))
+    assert time.monotonic() - started < 0.5
+
+
+def test_circuit_breaker_opens_and_recovers():
+    calls = []
+    healthy = False
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, content=b"ok") if healthy else httpx.Response(503)
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    async def main():
+        nonlocal healthy
+        transport = make_transport(handler, max_retries=1, breaker=breaker)
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await anext(transport.stream("POST", "/chat/completions", {}))
+            assert breaker.state == "open"
+            assert len(calls) == 2
+
+            # пока брейкер открыт, запрос до апстрима не доходит
+            with pytest.raises(CircuitOpenError):
+                await anext(transport.stream("POST", "/chat/completions", {}))
+            assert len(calls) == 2
+
+            await asyncio.sleep(0.06)
+            assert breaker.state == "half-open"
+            healthy = True
+            assert b"".join([chunk async for chunk in transport.stream("POST", "/chat/completions", {})]) == b"ok"
+            assert breaker.state == "closed"
+            assert len(calls) == 3
+        finally:
+            await transport.aclose()
+
+    asyncio.run(main())
+
+
+def test_hedging_cancels_slower_request():
+    calls = []
+    cancelled = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(request)
+                raise
+            return httpx.Response(200, content=b"slow")
+        return httpx.Response(200, content=b"fast")
+
+    async def main():
+        transport = make_transport(handler, hedge_enabled=True, hedge_min_samples=1)
+        transport._ttft_samples.append(0.02)
+        started = time.monotonic()
+        assert await collect(transport) == b"fast"
+        assert time.monotonic() - started < 0.5
+        assert transport.hedged_requests == 1
+        assert len(calls) == 2
+        assert len(cancelled) == 1
+
+    asyncio.run(main())
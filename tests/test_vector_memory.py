@@ -0,0 +1,92 @@
+import asyncio
+import uuid
+
+import numpy as np
+
+from app.database.vector_memory import InMemoryVectorStore
+from app.database.vector_store import VectorFilter, VectorPoint
+
+
+def point(vector, **payload) -> VectorPoint:
+    return VectorPoint(id=uuid.uuid4(), vector=vector, payload=payload)
+
+
+def make_store(points, **kwargs) -> InMemoryVectorStore:
+    store = InMemoryVectorStore(**kwargs)
+
+    async def fill():
+        await store.ensure_collection("test", 2)
+        await store.upsert("test", points)
+
+    asyncio.run(fill())
+    return store
+
+
+def search(store, vector, limit=10, filters=None, min_score=None):
+    return asyncio.run(store.search("test", vector, limit, filters=filters, min_score=min_score))
+
+
+def test_search_ranks_by_cosine_similarity():
+    store = make_store([
+        point([1.0, 0.0], name="x"),
+        point([0.0, 1.0], name="y"),
+        point([1.0, 1.0], name="xy"),
+    ])
+    hits = search(store, [2.0, 0.1])
+    assert [hit.payload["name"] for hit in hits] == ["x", "xy", "y"]
+    assert [hit.payload["name"] for hit in search(store, [1.0, 0.0], limit=1)] == ["x"]
+    assert [hit.payload["name"] for hit in search(store, [1.0, 0.0], min_score=0.5)] == ["x", "xy"]
+
+
+def test_search_filters():
+    store = make_store([
+        point([1.0, 0.0], chat_id="a", index=0),
+        point([1.0, 0.1], chat_id="a", index=5),
+        point([1.0, 0.2], chat_id="b", index=1),
+        point([1.0, 0.3], chat_id="c", index=2),
+    ])
+    match = search(store, [1.0, 0.0], filters=VectorFilter(match={"chat_id": "a"}, lt={"index": 3}))
+    assert [(hit.payload["chat_id"], hit.payload["index"]) for hit in match] == [("a", 0)]
+    any_of = search(store, [1.0, 0.0], filters=VectorFilter(any={"chat_id": ["b", "c"]}))
+    assert sorted(hit.payload["chat_id"] for hit in any_of) == ["b", "c"]
+    assert search(store, [1.0, 0.0], filters=VectorFilter(match={"chat_id": "missing"})) == []
+
+
+def test_upsert_replaces_point_with_same_id():
+    original = point([1.0, 0.0], chat_id="a", text="old")
+    store = make_store([original])
+    asyncio.run(store.upsert("test", [VectorPoint(id=original.id, vector=[0.0, 1.0], payload={"chat_id": "b"})]))
+    hits = search(store, [0.0, 1.0])
+    assert len(hits) == 1
+    assert hits[0].id == original.id
+    assert hits[0].payload == {"chat_id": "b"}
+    # старое значение поля не должно оставаться в индексе фильтров
+    assert search(store, [0.0, 1.0], filters=VectorFilter(match={"chat_id": "a"})) == []
+
+
+def test_delete_by_filter():
+    store = make_store([
+        point([1.0, 0.0], file_id="a"),
+        point([0.0, 1.0], file_id="a"),
+        point([1.0, 1.0], file_id="b"),
+    ])
+    asyncio.run(store.delete("test", VectorFilter(match={"file_id": "a"})))
+    assert [hit.payload["file_id"] for hit in search(store, [1.0, 0.0])] == ["b"]
+    asyncio.run(store.delete("missing", VectorFilter(match={"file_id": "b"})))
+
+
+def test_ivf_index_finds_nearest_point():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(400, 2)).tolist()
+    points = [point(vector, row=i) for i, vector in enumerate(vectors)]
+    store = make_store(points, nlist=4, nprobe=2, ivf_min_points=100)
+    assert store._collections["test"].centroids is not None
+    for row in (0, 123, 399):
+        assert search(store, vectors[row], limit=1)[0].payload["row"] == row
+
+    # точки после обучения распределяются по спискам и находятся поиском, удалённые — нет
+    late = point([-1.0, -1.0], row="late")
+    asyncio.run(store.upsert("test", [late]))
+    assert search(store, [-1.0, -1.0], limit=1)[0].id == late.id
+    asyncio.run(store.delete("test", VectorFilter(match={"row": "late"})))
+    assert all(hit.id != late.id for hit in search(store, [-1.0, -1.0], limit=400))